@@ -1,24 +1,39 @@
 # -*- coding: utf-8 -*-
 # --- app.py：Flask 應用程式入口（組裝與啟動）---
 import logging
-from flask import Flask
-from database.db import setup_database
-from routes.dashboard import dashboard_bp
-from routes.api import api_bp
-from scheduler import start_scheduler
-from trading.executor import run_trading_job
+from startup_profiler import timed, log_startup_report
+
+with timed('import flask'):
+    from flask import Flask
+with timed('import database.db'):
+    from database.db import setup_database
+with timed('import routes.dashboard'):
+    from routes.dashboard import dashboard_bp
+with timed('import routes.api'):
+    from routes.api import api_bp
+with timed('import routes.events'):
+    from routes.events import events_bp
+with timed('import scheduler'):
+    from scheduler import start_scheduler
 
 
 def create_app() -> Flask:
     """Flask 應用程式工廠函式（供 gunicorn / Railway 使用）。"""
-    app = Flask(__name__)
-    app.register_blueprint(dashboard_bp)
-    app.register_blueprint(api_bp)
+    with timed('register blueprints'):
+        app = Flask(__name__)
+        app.register_blueprint(dashboard_bp)
+        app.register_blueprint(api_bp)
+        app.register_blueprint(events_bp)
 
-    with app.app_context():
+    # 遷移通常已由 gunicorn master（gunicorn.conf.py）執行過，這裡只剩一次版本比對查詢
+    with timed('setup_database (schema version check)'), app.app_context():
         setup_database()
 
-    start_scheduler(run_trading_job)
+    # 排程鎖在背景執行緒競爭；交易模組（pandas / yfinance）在任務第一次執行時才匯入
+    with timed('start_scheduler'):
+        start_scheduler()
+
+    log_startup_report()
     return app
 
 
@@ -28,4 +43,4 @@ if __name__ == '__main__':
         logging.error("❌ 錯誤：未設定 DATABASE_URL 環境變數，無法啟動。")
     else:
         app = create_app()
-        app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+        app.run(host='0.0.0.0', port=5001, debug=True)
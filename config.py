@@ -9,8 +9,44 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 DATABASE_URL = os.environ.get('DATABASE_URL')
 API_SECRET_KEY = os.environ.get('API_SECRET_KEY')
 FINMIND_API_TOKEN = os.environ.get('FINMIND_API_TOKEN')
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', 'data/bars')
 
 # --- 交易策略常數 ---
 CASH = 1_000_000          # 預設初始資金
 STOP_LOSS_PCT = 0.15      # 停損點：15%
 TAKE_PROFIT_PCT = 0.30    # 停利點：30%
+DEFAULT_STRATEGY = 'minervini'  # 未指定時使用的策略（見 trading/strategy.py 的註冊表）
+
+# --- 投資組合回測常數 ---
+MAX_POSITIONS = 10        # 同時持有的最大檔數
+POSITION_SIZE_PCT = 0.10  # 每檔進場金額佔總資產比例
+
+# --- 分K串流回測常數 ---
+TRADING_MINUTES_PER_DAY = 270   # 台股 09:00–13:30，每日 270 根 1 分K
+INTRADAY_CHUNK_BARS = 100_000   # 每次從本地分K資料庫讀入的 K 棒數
+
+# --- yfinance 請求協調（合併、限流、重試）---
+YF_RATE_PER_SEC = 2.0     # 令牌補充速率（每秒請求數）
+YF_BURST = 5              # 令牌桶容量（允許的突發請求數）
+YF_MAX_RETRIES = 3        # 例外或空資料時的最大重試次數
+YF_BACKOFF_BASE = 0.5     # 指數退避基準秒數
+YF_BACKOFF_CAP = 8.0      # 單次退避上限秒數
+YF_BULK_RATE_PER_SEC = 4.0  # 批次回測下載通道的令牌補充速率（與即時請求分開計算）
+YF_BULK_BURST = 10
+YF_BULK_MAX_RETRIES = 1   # 批次下載的標的多，失敗時少重試以免拖長整體時間
+YF_EMPTY_RANGE_RETRIES = 1  # 日期範圍請求返回空資料時的重試次數（可能是限流，也可能確實無資料）
+
+# --- 即時推播 (SSE) ---
+# 每條 SSE 連線在 gthread worker 中佔用一個執行緒；限制存活時間與每個 worker 的連線數，
+# 保留執行緒給一般頁面與 API 請求
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))  # 與 Procfile 的 --threads 相同
+SSE_MAX_STREAM_SECONDS = 300  # 單條連線最長存活秒數，到期後由瀏覽器依 retry 自動重連
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', max(1, GUNICORN_THREADS // 2)))  # 每個 worker 的 SSE 連線上限
+
+# --- 穩健性分析 ---
+ROBUSTNESS_WORKERS = int(os.environ.get('ROBUSTNESS_WORKERS', 0)) or None  # 行程池大小，None 表示使用所有 CPU 核心
+
+# --- 資料表分區與歸檔 ---
+PARTITION_INTERVAL = os.environ.get('PARTITION_INTERVAL', 'year')  # 'year' 或 'month'
+PARTITIONS_AHEAD = 2        # 預先建立的未來分區數
+ARCHIVE_AFTER_YEARS = int(os.environ.get('ARCHIVE_AFTER_YEARS', 5))  # 超過幾年的分區移入 archive schema
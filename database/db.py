@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 # --- database/db.py：所有 PostgreSQL 資料庫操作 ---
 import logging
+from datetime import date as date_type
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from config import DATABASE_URL
+from config import DATABASE_URL, PARTITION_INTERVAL, PARTITIONS_AHEAD, ARCHIVE_AFTER_YEARS
+from database import partitions
 
 
 def get_db_connection():
@@ -13,42 +15,106 @@ def get_db_connection():
     return psycopg2.connect(DATABASE_URL)
 
 
+# --- 資料庫遷移：依版本號遞增，每個版本只會執行一次 ---
+MIGRATIONS = [
+    (1, "建立 trades / daily_performance / settings 資料表", [
+        '''
+        CREATE TABLE IF NOT EXISTS trades (
+            trade_id SERIAL PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            stock_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            shares INTEGER NOT NULL,
+            price REAL NOT NULL,
+            total_value REAL NOT NULL,
+            profit REAL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS daily_performance (
+            date TEXT NOT NULL,
+            stock_id TEXT NOT NULL,
+            asset_value REAL NOT NULL,
+            PRIMARY KEY (date, stock_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+        "INSERT INTO settings (key, value) VALUES ('live_stock_id', '2330.TW') ON CONFLICT (key) DO NOTHING",
+    ]),
+    (2, "trades / daily_performance 改為依時間範圍分區", [
+        lambda cur: partitions.migrate_to_partitioned(cur, PARTITION_INTERVAL, date_type.today(), PARTITIONS_AHEAD),
+    ]),
+    (3, "portfolio_checkpoints 累計欄位改為 DOUBLE PRECISION", [
+        # 檢查點在每次歸檔時讀回再累加，REAL 只有約 7 位有效數字，百萬級現金會失去小數
+        "ALTER TABLE portfolio_checkpoints "
+        "ALTER COLUMN cash_delta TYPE DOUBLE PRECISION, ALTER COLUMN avg_cost TYPE DOUBLE PRECISION",
+    ]),
+    (4, "記錄遷移時採用的分區週期", [
+        # 分區配置在 v2 遷移時就已決定；之後的維護一律沿用，不受 PARTITION_INTERVAL 環境變數變更影響。
+        # 依 v2 建立的分區名稱判斷：月分區為 trades_pYYYY_MM，年分區為 trades_pYYYY
+        "INSERT INTO settings (key, value) SELECT 'partition_interval', "
+        "CASE WHEN EXISTS (SELECT 1 FROM pg_class WHERE relname ~ '^trades_p[0-9]{4}_[0-9]{2}$') "
+        "THEN 'month' ELSE 'year' END ON CONFLICT (key) DO NOTHING",
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+MIGRATION_LOCK_ID = 726_001  # pg_advisory_lock 的識別碼，避免多個 worker 同時遷移
+
+
+def _get_schema_version(cur) -> int:
+    """讀取目前已套用的最大遷移版本；schema_migrations 不存在時視為 0。"""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cur.fetchone()[0]
+
+
 def setup_database():
-    """初始化資料庫，建立必要的資料表。"""
-    logging.info("🚀 正在設定 PostgreSQL 資料庫...")
+    """
+    初始化 / 遷移資料庫結構。
+
+    先以一次唯讀查詢比對版本號，已是最新時直接返回，不執行任何 DDL；
+    需要遷移時才取得 advisory lock，確保多個 worker 或多台機器同時啟動時只有一個執行。
+    """
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
+            if _get_schema_version(cur) >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+
+        logging.info("🚀 正在設定 PostgreSQL 資料庫...")
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
             cur.execute('''
-                CREATE TABLE IF NOT EXISTS trades (
-                    trade_id SERIAL PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    stock_id TEXT NOT NULL,
-                    action TEXT NOT NULL,
-                    shares INTEGER NOT NULL,
-                    price REAL NOT NULL,
-                    total_value REAL NOT NULL,
-                    profit REAL
-                )
-            ''')
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS daily_performance (
-                    date TEXT NOT NULL,
-                    stock_id TEXT NOT NULL,
-                    asset_value REAL NOT NULL,
-                    PRIMARY KEY (date, stock_id)
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
                 )
             ''')
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL
+            # 取得鎖之後重新讀取版本，其他 worker 可能已完成遷移
+            current_version = _get_schema_version(cur)
+            for version, description, statements in MIGRATIONS:
+                if version <= current_version:
+                    continue
+                for statement in statements:
+                    # 需要依現有資料動態產生 DDL 的遷移以函式表示，接收 cursor 執行
+                    if callable(statement):
+                        statement(cur)
+                    else:
+                        cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
                 )
-            ''')
-            cur.execute(
-                "INSERT INTO settings (key, value) VALUES (%s, %s) ON CONFLICT (key) DO NOTHING",
-                ('live_stock_id', '2330.TW')
-            )
+                logging.info(f"   - 已套用遷移 v{version}: {description}")
         conn.commit()
         logging.info("✅ 資料庫設定完成。")
     except Exception as e:
@@ -120,39 +186,164 @@ def log_performance(date, stock_id, asset_value):
         conn.close()
 
 
-def get_trades(stock_id):
-    """取得指定股票的所有交易紀錄（依時間降冪排列）。"""
+def _range_clause(column, start=None, end=None):
+    """
+    產生分區鍵的範圍條件（start 含、end 不含，皆為 'YYYY-MM-DD' 字串）。
+
+    條件直接作用在分區鍵上，PostgreSQL 才能在規劃時略過範圍外的分區（partition pruning）。
+    """
+    clause, params = "", []
+    if start:
+        clause += f" AND {column} >= %s"
+        params.append(str(start))
+    if end:
+        clause += f" AND {column} < %s"
+        params.append(str(end))
+    return clause, params
+
+
+def get_trades(stock_id, start=None, end=None):
+    """取得指定股票的交易紀錄（依時間降冪排列）；可指定日期範圍以只掃描相關分區。"""
+    range_sql, range_params = _range_clause('timestamp', start, end)
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM trades WHERE stock_id = %s ORDER BY timestamp DESC", (stock_id,))
+            cur.execute(
+                f"SELECT * FROM trades WHERE stock_id = %s{range_sql} ORDER BY timestamp DESC",
+                (stock_id, *range_params)
+            )
             return cur.fetchall()
     finally:
         conn.close()
 
 
-def get_performance(stock_id):
-    """取得指定股票的每日績效資料（依日期升冪排列）。"""
+def get_performance(stock_id, start=None, end=None):
+    """取得指定股票的每日績效資料（依日期升冪排列）；可指定日期範圍以只掃描相關分區。"""
+    range_sql, range_params = _range_clause('date', start, end)
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT * FROM daily_performance WHERE stock_id = %s ORDER BY date ASC", (stock_id,))
+            cur.execute(
+                f"SELECT * FROM daily_performance WHERE stock_id = %s{range_sql} ORDER BY date ASC",
+                (stock_id, *range_params)
+            )
             return cur.fetchall()
     finally:
         conn.close()
 
 
-def get_buy_sell_trades(stock_id):
-    """取得指定股票的買賣交易紀錄，用於計算持倉（依時間升冪排列）。"""
+def get_buy_sell_trades(stock_id, since=None):
+    """
+    取得指定股票的買賣交易紀錄，用於計算持倉（依時間升冪排列）。
+
+    since 通常為持倉檢查點的時間，只讀取尚未歸檔的分區。
+    """
+    range_sql, range_params = _range_clause('timestamp', since)
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(
                 "SELECT action, shares, price FROM trades "
-                "WHERE stock_id = %s AND (action = '執行買入' OR action LIKE '%%賣出') "
-                "ORDER BY timestamp ASC",
-                (stock_id,)
+                f"WHERE stock_id = %s AND (action = '執行買入' OR action LIKE '%%賣出'){range_sql} "
+                "ORDER BY timestamp ASC, trade_id ASC",
+                (stock_id, *range_params)
+            )
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def get_portfolio_checkpoint(stock_id):
+    """取得指定股票歸檔交易累積的持倉檢查點（未歸檔過時返回 None）。"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM portfolio_checkpoints WHERE stock_id = %s", (stock_id,))
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def get_latest_trade_id(stock_id):
+    """取得指定股票目前最大的 trade_id（無紀錄時為 0）。"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(trade_id), 0) FROM trades WHERE stock_id = %s", (stock_id,))
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_trades_after(stock_id, trade_id, since=None):
+    """
+    取得指定股票在 trade_id 之後新增的交易紀錄（依時間降冪排列，與 get_trades 相同）。
+
+    since 為這些交易的最早日期，讓查詢只掃描當期分區。
+    """
+    range_sql, range_params = _range_clause('timestamp', since)
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"SELECT * FROM trades WHERE stock_id = %s AND trade_id > %s{range_sql} "
+                "ORDER BY timestamp DESC, trade_id DESC",
+                (stock_id, trade_id, *range_params)
             )
             return cur.fetchall()
     finally:
         conn.close()
+
+
+def notify(channel, payload):
+    """以 pg_notify 廣播訊息給所有 LISTEN 該頻道的連線。"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_partition_maintenance():
+    """
+    分區維護排程任務：
+
+    1. 預先建立本期與未來 PARTITIONS_AHEAD 期的分區，避免資料落入 DEFAULT 分區
+    2. 將結束日早於 ARCHIVE_AFTER_YEARS 年前的分區歸檔（trades 先寫入持倉檢查點）
+
+    分區週期以遷移時記錄在 settings 的 partition_interval 為準，之後修改 PARTITION_INTERVAL
+    環境變數不會改變既有配置。每個分區各自在一個交易中完成；失敗時回滾該分區並記錄錯誤。
+    """
+    interval = get_setting('partition_interval') or PARTITION_INTERVAL
+    today = date_type.today()
+    last_day = today
+    for _ in range(PARTITIONS_AHEAD):
+        last_day = partitions.next_period(partitions.period_start(last_day, interval), interval)
+    cutoff = date_type(today.year - ARCHIVE_AFTER_YEARS, 1, 1)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for table in partitions.PARTITIONED_TABLES:
+                created = partitions.ensure_partitions(cur, table, today, last_day, interval)
+                conn.commit()
+                if created:
+                    logging.info(f"🗂️ {table} 新建 {created} 個分區")
+
+                for name, _, end in partitions.list_partitions(cur, table):
+                    if end > cutoff:
+                        break
+                    try:
+                        partitions.archive_partition(cur, table, name, end)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logging.error(f"❌ 歸檔分區 {name} 失敗: {e}")
+                        break
+    except Exception as e:
+        logging.error(f"❌ 分區維護失敗: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# --- database/partitions.py：trades / daily_performance 的時間分區與歸檔 ---
+import logging
+import re
+from datetime import date
+
+# 分區資料表 → 分區鍵欄位（皆為 'YYYY-MM-DD...' 格式的 TEXT，以 "C" 定序確保依字元排序）
+PARTITIONED_TABLES = {
+    'trades': 'timestamp',
+    'daily_performance': 'date',
+}
+ARCHIVE_SCHEMA = 'archive'
+
+_PARTITIONED_DDL = {
+    'trades': '''
+        CREATE TABLE trades (
+            trade_id INTEGER NOT NULL DEFAULT nextval('trades_trade_id_seq'),
+            timestamp TEXT COLLATE "C" NOT NULL,
+            stock_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            shares INTEGER NOT NULL,
+            price REAL NOT NULL,
+            total_value REAL NOT NULL,
+            profit REAL,
+            PRIMARY KEY (trade_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    ''',
+    'daily_performance': '''
+        CREATE TABLE daily_performance (
+            date TEXT COLLATE "C" NOT NULL,
+            stock_id TEXT NOT NULL,
+            asset_value REAL NOT NULL,
+            PRIMARY KEY (date, stock_id)
+        ) PARTITION BY RANGE (date)
+    ''',
+}
+_INDEX_DDL = {
+    'trades': "CREATE INDEX IF NOT EXISTS trades_stock_id_timestamp_idx ON trades (stock_id, timestamp)",
+    'daily_performance': "CREATE INDEX IF NOT EXISTS daily_performance_stock_id_date_idx ON daily_performance (stock_id, date)",
+}
+_COLUMNS = {
+    'trades': 'trade_id, timestamp, stock_id, action, shares, price, total_value, profit',
+    'daily_performance': 'date, stock_id, asset_value',
+}
+
+
+def period_start(day: date, interval: str) -> date:
+    """返回 day 所在分區（'year' 或 'month'）的起始日。"""
+    return date(day.year, 1, 1) if interval == 'year' else date(day.year, day.month, 1)
+
+
+def next_period(start: date, interval: str) -> date:
+    """返回下一個分區的起始日（即本分區的結束日，不含）。"""
+    if interval == 'year' or start.month == 12:
+        return date(start.year + 1, 1, 1)
+    return date(start.year, start.month + 1, 1)
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    """分區命名：年分區 trades_p2024，月分區 trades_p2024_01。"""
+    return f"{table}_p{start:%Y}" if interval == 'year' else f"{table}_p{start:%Y_%m}"
+
+
+def create_partition(cur, table: str, start: date, interval: str) -> bool:
+    """
+    建立涵蓋 [start, 下一期) 的分區；已存在、或範圍與既有分區重疊（例如月分區落在
+    已建立的年分區內）時不做任何事。
+
+    先建立獨立資料表、把預設分區（DEFAULT）中落在此範圍的資料搬入，再 ATTACH，
+    因此即使資料先寫進了預設分區，也能補建分區而不違反分區約束。
+
+    Returns:
+        bool: 是否新建了分區
+    """
+    name = partition_name(table, start, interval)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    if cur.fetchone()[0]:
+        return False
+
+    end = next_period(start, interval)
+    if any(p_start < end and start < p_end for _, p_start, p_end in list_partitions(cur, table)):
+        return False
+
+    key = PARTITIONED_TABLES[table]
+    lower, upper = start.isoformat(), end.isoformat()
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        (lower, upper)
+    )
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+    logging.info(f"🗂️ 已建立分區 {name} [{lower}, {upper})")
+    return True
+
+
+def ensure_partitions(cur, table: str, first_day: date, last_day: date, interval: str) -> int:
+    """建立從 first_day 到 last_day 所在期間的所有分區，返回新建數量。"""
+    created = 0
+    start = period_start(first_day, interval)
+    while start <= last_day:
+        created += create_partition(cur, table, start, interval)
+        start = next_period(start, interval)
+    return created
+
+
+def list_partitions(cur, table: str) -> list:
+    """
+    列出資料表目前掛載的分區（不含 DEFAULT），依起始日升冪排列。
+
+    Returns:
+        list[tuple]: [(分區名稱, 起始日, 結束日（不含）), ...]
+    """
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        (table,)
+    )
+    pattern = re.compile(rf'^{table}_p(\d{{4}})(?:_(\d{{2}}))?$')
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = pattern.match(name)
+        if not match:
+            continue
+        year, month = match.groups()
+        interval = 'month' if month else 'year'
+        start = date(int(year), int(month or 1), 1)
+        partitions.append((name, start, next_period(start, interval)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def replay_trades(portfolio: dict, trades) -> dict:
+    """
+    依時間順序將買賣紀錄套用到持倉狀態 {'cash', 'position', 'avg_cost'}（就地修改並返回）。
+
+    買入以加權平均更新成本；任何賣出皆為全部出清。
+    """
+    for trade in trades:
+        if trade['action'] == "執行買入":
+            trade_cost = float(trade['price']) * int(trade['shares'])
+            old_total = portfolio['avg_cost'] * portfolio['position']
+            new_total = old_total + trade_cost
+            portfolio['position'] += int(trade['shares'])
+            portfolio['cash'] -= trade_cost
+            if portfolio['position'] > 0:
+                portfolio['avg_cost'] = new_total / portfolio['position']
+        elif "賣出" in trade['action']:
+            portfolio['cash'] += float(trade['price']) * int(trade['shares'])
+            portfolio['position'] = 0
+            portfolio['avg_cost'] = 0
+    return portfolio
+
+
+def _checkpoint_partition(cur, name: str, end: date):
+    """
+    歸檔 trades 分區前，把分區內的買賣紀錄累加到各股票的持倉檢查點。
+
+    get_current_portfolio 以「初始資金 + 檢查點」為起點，只重播尚未歸檔的交易，
+    因此歸檔後現金與持倉仍然正確。
+    """
+    cur.execute(
+        f"SELECT stock_id, action, shares, price FROM {name} "
+        f"WHERE action = '執行買入' OR action LIKE '%賣出' ORDER BY timestamp ASC, trade_id ASC"
+    )
+    trades_by_stock = {}
+    for stock_id, action, shares, price in cur.fetchall():
+        trades_by_stock.setdefault(stock_id, []).append({'action': action, 'shares': shares, 'price': price})
+
+    for stock_id, trades in trades_by_stock.items():
+        cur.execute(
+            "SELECT cash_delta, position, avg_cost FROM portfolio_checkpoints WHERE stock_id = %s",
+            (stock_id,)
+        )
+        row = cur.fetchone()
+        state = {'cash': row[0], 'position': row[1], 'avg_cost': row[2]} if row else \
+            {'cash': 0.0, 'position': 0, 'avg_cost': 0.0}
+        replay_trades(state, trades)
+        cur.execute(
+            '''
+            INSERT INTO portfolio_checkpoints (stock_id, as_of, cash_delta, position, avg_cost)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (stock_id) DO UPDATE SET as_of = EXCLUDED.as_of, cash_delta = EXCLUDED.cash_delta,
+                position = EXCLUDED.position, avg_cost = EXCLUDED.avg_cost
+            ''',
+            (stock_id, end.isoformat(), float(state['cash']), int(state['position']), float(state['avg_cost']))
+        )
+
+
+def archive_partition(cur, table: str, name: str, end: date):
+    """
+    將分區自主表卸載（DETACH）並移入 archive schema。
+
+    歸檔後的分區不再被讀取、也不隨主表 VACUUM；需要時可以 pg_dump -n archive 匯出壓縮後刪除。
+    """
+    if table == 'trades':
+        _checkpoint_partition(cur, name, end)
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+    cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+    logging.info(f"📦 已歸檔分區 {name} 至 {ARCHIVE_SCHEMA} schema")
+
+
+def migrate_to_partitioned(cur, interval: str, today: date, periods_ahead: int):
+    """
+    遷移：將既有的 trades / daily_performance 轉為依時間範圍分區的資料表。
+
+    舊表改名保留到資料複製完成後刪除；trade_id 序列沿用，既有編號不變。
+    """
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_checkpoints (
+            stock_id TEXT PRIMARY KEY,
+            as_of TEXT NOT NULL,
+            cash_delta DOUBLE PRECISION NOT NULL,
+            position INTEGER NOT NULL,
+            avg_cost DOUBLE PRECISION NOT NULL
+        )
+    ''')
+
+    last_day = today
+    for _ in range(periods_ahead):
+        last_day = next_period(period_start(last_day, interval), interval)
+
+    for table, key in PARTITIONED_TABLES.items():
+        legacy = f"{table}_unpartitioned"
+        cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cur.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+        if table == 'trades':
+            cur.execute("ALTER SEQUENCE trades_trade_id_seq OWNED BY NONE")
+
+        cur.execute(_PARTITIONED_DDL[table])
+        cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        cur.execute(_INDEX_DDL[table])
+
+        cur.execute(f"SELECT MIN({key}), MAX({key}) FROM {legacy}")
+        oldest, newest = cur.fetchone()
+        first_day = date.fromisoformat(oldest[:10]) if oldest else today
+        if newest:
+            last_day = max(last_day, date.fromisoformat(newest[:10]))
+        ensure_partitions(cur, table, first_day, last_day, interval)
+
+        columns = _COLUMNS[table]
+        cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {legacy}")
+        cur.execute(f"DROP TABLE {legacy}")
+        if table == 'trades':
+            cur.execute("ALTER SEQUENCE trades_trade_id_seq OWNED BY trades.trade_id")
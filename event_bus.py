@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# --- event_bus.py：即時事件廣播（PostgreSQL LISTEN/NOTIFY → 各 worker 的 SSE 訂閱者）---
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from database import db
+
+EVENT_CHANNEL = 'trading_events'
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener_started = False
+
+
+def publish_event(event: str, data: dict):
+    """
+    透過 NOTIFY 發佈事件。
+
+    交易任務可能在任一 gunicorn worker 執行，而 SSE 連線可能落在其他 worker，
+    因此不直接寫入本地佇列，而是經由資料庫廣播給所有 worker 的監聽執行緒。
+    """
+    db.notify(EVENT_CHANNEL, json.dumps({'event': event, 'data': data}, default=str))
+
+
+def subscribe(max_subscribers: int = None):
+    """
+    註冊一個新的訂閱者，返回其專屬佇列（第一次呼叫時啟動監聽執行緒）。
+
+    本 worker 的訂閱者已達 max_subscribers 時不註冊，返回 None。
+    """
+    _ensure_listener()
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        if max_subscribers is not None and len(_subscribers) >= max_subscribers:
+            return None
+        _subscribers.add(q)
+    return q
+
+
+def unsubscribe(q: queue.Queue):
+    with _subscribers_lock:
+        _subscribers.discard(q)
+
+
+def _dispatch(message: dict):
+    """將事件放入本 worker 所有訂閱者的佇列；佇列已滿（客戶端過慢）時丟棄。"""
+    with _subscribers_lock:
+        targets = list(_subscribers)
+    for q in targets:
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            logging.warning("⚠️ SSE 訂閱者佇列已滿，丟棄事件")
+
+
+def _listen_forever():
+    """持續 LISTEN 事件頻道，斷線時自動重連。"""
+    while True:
+        conn = None
+        try:
+            conn = db.get_db_connection()
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {EVENT_CHANNEL}")
+            logging.info(f"📡 已開始監聽事件頻道 {EVENT_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    _dispatch(json.loads(notify.payload))
+        except Exception as e:
+            logging.error(f"❌ 事件監聽中斷，5 秒後重連: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def _ensure_listener():
+    global _listener_started
+    with _subscribers_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=_listen_forever, name='event-listener', daemon=True).start()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# --- gunicorn.conf.py：gunicorn 啟動時自動載入的設定 ---
+import logging
+
+
+def on_starting(server):
+    """在 master 行程 fork worker 之前執行一次資料庫遷移（每次部署只跑一次）。"""
+    from database.db import setup_database
+    try:
+        setup_database()
+    except Exception as e:
+        logging.error(f"❌ 部署前資料庫遷移失敗，將由 worker 重試: {e}")
@@ -2,13 +2,11 @@
 # --- routes/api.py：所有 API 端點（觸發交易、回測、設定） ---
 import logging
 import traceback
-import pandas as pd
 from flask import Blueprint, request, jsonify
-from config import API_SECRET_KEY, CASH, STOP_LOSS_PCT, TAKE_PROFIT_PCT
+from config import API_SECRET_KEY, CASH, MAX_POSITIONS, POSITION_SIZE_PCT, DEFAULT_STRATEGY
 from database import db
-from trading.data_fetcher import get_historical_data_range, _normalize_stock_id
-from trading.strategy import apply_signals_to_dataframe
-from trading.executor import run_trading_job
+
+# pandas / yfinance 等重量級模組只在端點第一次被呼叫時才匯入，縮短 worker 啟動時間
 
 api_bp = Blueprint('api', __name__)
 
@@ -19,6 +17,7 @@ def trigger_trade_check():
     auth_header = request.headers.get('Authorization')
     if auth_header != f"Bearer {API_SECRET_KEY}":
         return jsonify({"status": "error", "message": "未經授權"}), 401
+    from trading.executor import run_trading_job
     result = run_trading_job()
     status_code = 200 if result.get('status') == 'success' else 500
     return jsonify(result), status_code
@@ -32,6 +31,11 @@ def update_settings_api():
     if not key or not value:
         return jsonify({"status": "error", "message": "缺少 key 或 value"}), 400
 
+    if key == 'live_strategy':
+        from trading.strategy import STRATEGIES
+        if value not in STRATEGIES:
+            return jsonify({"status": "error", "message": f"未知的策略: {value}"}), 400
+
     if key == 'initial_cash':
         stock_id = data.get('stock_id')
         if not stock_id:
@@ -48,100 +52,57 @@ def update_settings_api():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@api_bp.route('/api/fetch-stats', methods=['GET'])
+def fetch_stats_api():
+    """返回 yfinance 請求協調器的進行中請求數、佇列深度與累計計數。"""
+    from trading.fetch_coordinator import get_fetch_stats
+    return jsonify(get_fetch_stats()), 200
+
+
+@api_bp.route('/api/startup-report', methods=['GET'])
+def startup_report_api():
+    """返回處理此請求之 worker 的啟動耗時報告（各模組匯入與初始化步驟）。"""
+    from startup_profiler import get_startup_report
+    return jsonify(get_startup_report()), 200
+
+
+@api_bp.route('/api/strategies', methods=['GET'])
+def list_strategies_api():
+    """列出已註冊的策略與其所需指標。"""
+    from trading.strategy import STRATEGIES
+    return jsonify([
+        {'name': st['name'], 'description': st['description'], 'indicators': list(st['indicators'])}
+        for st in STRATEGIES.values()
+    ]), 200
+
+
 @api_bp.route('/api/run-backtest', methods=['POST'])
 def handle_backtest():
     """執行歷史回測並返回每日資產曲線與交易紀錄。"""
+    import pandas as pd
+    from trading.data_fetcher import get_historical_data_range, _normalize_stock_id
+    from trading.strategy import STRATEGIES
+    from trading.backtest import run_backtest
     try:
         params = request.get_json()
         stock_id = params.get('stock_id', '2330.TW')
         start_date = params.get('start_date', '2024-01-01')
         end_date = params.get('end_date') or pd.Timestamp.now().strftime('%Y-%m-%d')
         initial_cash = int(params.get('initial_cash', CASH))
+        strategy = params.get('strategy') or DEFAULT_STRATEGY
+        if strategy not in STRATEGIES:
+            return jsonify({"error": f"未知的策略: {strategy}"}), 400
 
         stock_id_query = _normalize_stock_id(stock_id)
-        df = get_historical_data_range(stock_id_query, start_date, end_date)
+        df = get_historical_data_range(stock_id_query, start_date, end_date, strategy)
 
         if df is None:
             return jsonify({"error": "無法從 yfinance 下載資料或指標計算失敗（資料不足）"}), 400
 
-        df = apply_signals_to_dataframe(df)
-
-        backtest_portfolio = {'cash': initial_cash, 'position': 0, 'avg_cost': 0}
-        daily_assets, trade_log = [], []
-        insufficient_funds = False
-        last_insufficient_price = 0
-
-        for index, row in df.iterrows():
-            price = row['close']
-            signal = row['signal']
-            ma50 = row['sma_50']
-            action_taken = False
-
-            # 1. 停損 / 停利 檢查
-            if backtest_portfolio['position'] > 0:
-                stop_loss_price = backtest_portfolio['avg_cost'] * (1 - STOP_LOSS_PCT)
-                take_profit_price = backtest_portfolio['avg_cost'] * (1 + TAKE_PROFIT_PCT)
-
-                if price < stop_loss_price:
-                    profit = (price - backtest_portfolio['avg_cost']) * backtest_portfolio['position']
-                    trade_log.append({
-                        'timestamp': str(index.date()), 'stock_id': stock_id,
-                        'action': '停損賣出', 'shares': backtest_portfolio['position'],
-                        'price': price, 'total_value': price * backtest_portfolio['position'],
-                        'profit': profit
-                    })
-                    backtest_portfolio['cash'] += price * backtest_portfolio['position']
-                    backtest_portfolio['position'] = 0
-                    backtest_portfolio['avg_cost'] = 0
-                    action_taken = True
-
-                elif price > take_profit_price:
-                    profit = (price - backtest_portfolio['avg_cost']) * backtest_portfolio['position']
-                    trade_log.append({
-                        'timestamp': str(index.date()), 'stock_id': stock_id,
-                        'action': '獲利了結(滿足30%)', 'shares': backtest_portfolio['position'],
-                        'price': price, 'total_value': price * backtest_portfolio['position'],
-                        'profit': profit
-                    })
-                    backtest_portfolio['cash'] += price * backtest_portfolio['position']
-                    backtest_portfolio['position'] = 0
-                    backtest_portfolio['avg_cost'] = 0
-                    action_taken = True
-
-                elif price < ma50 and price > backtest_portfolio['avg_cost']:
-                    profit = (price - backtest_portfolio['avg_cost']) * backtest_portfolio['position']
-                    trade_log.append({
-                        'timestamp': str(index.date()), 'stock_id': stock_id,
-                        'action': '動態停利(跌破MA50)', 'shares': backtest_portfolio['position'],
-                        'price': price, 'total_value': price * backtest_portfolio['position'],
-                        'profit': profit
-                    })
-                    backtest_portfolio['cash'] += price * backtest_portfolio['position']
-                    backtest_portfolio['position'] = 0
-                    backtest_portfolio['avg_cost'] = 0
-                    action_taken = True
-
-            # 2. 買入訊號處理
-            if not action_taken and signal == "買入":
-                if backtest_portfolio['position'] == 0 or price > backtest_portfolio['avg_cost']:
-                    shares_to_buy = int(backtest_portfolio['cash'] // price)
-                    if shares_to_buy > 0:
-                        old_total = backtest_portfolio['avg_cost'] * backtest_portfolio['position']
-                        new_total = old_total + (price * shares_to_buy)
-                        backtest_portfolio['position'] += shares_to_buy
-                        backtest_portfolio['cash'] -= price * shares_to_buy
-                        backtest_portfolio['avg_cost'] = new_total / backtest_portfolio['position']
-                        trade_log.append({
-                            'timestamp': str(index.date()), 'stock_id': stock_id,
-                            'action': '執行買入', 'shares': shares_to_buy,
-                            'price': price, 'total_value': price * shares_to_buy,
-                            'profit': None
-                        })
-                    elif backtest_portfolio['position'] == 0:
-                        insufficient_funds = True
-                        last_insufficient_price = price
-
-            daily_assets.append(backtest_portfolio['cash'] + (backtest_portfolio['position'] * price))
+        result = run_backtest(df, initial_cash, stock_id, strategy)
+        daily_assets, trade_log = result['daily_assets'], result['trade_log']
+        insufficient_funds = result['insufficient_funds']
+        last_insufficient_price = result['last_insufficient_price']
 
         if len(trade_log) == 0 and insufficient_funds:
             return jsonify({
@@ -165,3 +126,116 @@ def handle_backtest():
         logging.error(f"回測 API 發生錯誤: {e}")
         logging.error(traceback.format_exc())
         return jsonify({"error": "回測時發生內部錯誤"}), 500
+
+
+@api_bp.route('/api/run-portfolio-backtest', methods=['POST'])
+def handle_portfolio_backtest():
+    """執行多標的共用資金池的投資組合回測。"""
+    import pandas as pd
+    from trading.strategy import STRATEGIES
+    from trading.portfolio_backtest import load_price_panel, run_portfolio_backtest
+    try:
+        params = request.get_json()
+        stock_ids = params.get('stock_ids') or []
+        if isinstance(stock_ids, str):
+            stock_ids = [s.strip() for s in stock_ids.split(',') if s.strip()]
+        if not stock_ids:
+            return jsonify({"error": "缺少 stock_ids"}), 400
+        start_date = params.get('start_date', '2024-01-01')
+        end_date = params.get('end_date') or pd.Timestamp.now().strftime('%Y-%m-%d')
+        initial_cash = int(params.get('initial_cash', CASH))
+        max_positions = int(params.get('max_positions', MAX_POSITIONS))
+        position_pct = float(params.get('position_pct', POSITION_SIZE_PCT))
+        strategy = params.get('strategy') or DEFAULT_STRATEGY
+        if strategy not in STRATEGIES:
+            return jsonify({"error": f"未知的策略: {strategy}"}), 400
+
+        panel = load_price_panel(stock_ids, start_date, end_date, strategy)
+        if panel is None:
+            return jsonify({"error": "所有標的皆無法從 yfinance 下載資料或指標計算失敗（資料不足）"}), 400
+
+        results = run_portfolio_backtest(panel, initial_cash, max_positions, position_pct, strategy)
+        results["symbols"] = panel['symbols']
+        return jsonify(results)
+
+    except Exception as e:
+        logging.error(f"投資組合回測 API 發生錯誤: {e}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "投資組合回測時發生內部錯誤"}), 500
+
+
+@api_bp.route('/api/run-intraday-backtest', methods=['POST'])
+def handle_intraday_backtest():
+    """以本地分K資料串流執行盤中回測（停損停利於 K 棒內觸發）。"""
+    import pandas as pd
+    from trading.data_fetcher import _normalize_stock_id
+    from trading.strategy import STRATEGIES
+    from trading.intraday_backtest import run_intraday_backtest
+    try:
+        params = request.get_json()
+        stock_id = _normalize_stock_id(params.get('stock_id', '2330.TW'))
+        start_date = params.get('start_date', '2024-01-01')
+        end_date = params.get('end_date') or pd.Timestamp.now().strftime('%Y-%m-%d')
+        initial_cash = int(params.get('initial_cash', CASH))
+        interval = params.get('interval', '1m')
+        strategy = params.get('strategy') or DEFAULT_STRATEGY
+        if strategy not in STRATEGIES:
+            return jsonify({"error": f"未知的策略: {strategy}"}), 400
+
+        results = run_intraday_backtest(stock_id, start_date, end_date, initial_cash, interval, strategy=strategy)
+        if not results['chart_data']['dates']:
+            return jsonify({"error": "指定期間內沒有本地分K資料"}), 400
+        return jsonify(results)
+
+    except (FileNotFoundError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"分K回測 API 發生錯誤: {e}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "分K回測時發生內部錯誤"}), 500
+
+
+@api_bp.route('/api/run-robustness', methods=['POST'])
+def handle_robustness():
+    """執行 walk-forward 與 Monte Carlo 穩健性分析，返回最終資產與回撤的分佈。"""
+    import pandas as pd
+    from trading.data_fetcher import get_historical_data_range, _normalize_stock_id
+    from trading.strategy import STRATEGIES
+    from trading.robustness import run_robustness_analysis, MAX_SIMULATIONS
+    try:
+        params = request.get_json()
+        stock_id = params.get('stock_id', '2330.TW')
+        start_date = params.get('start_date', '2015-01-01')
+        end_date = params.get('end_date') or pd.Timestamp.now().strftime('%Y-%m-%d')
+        initial_cash = int(params.get('initial_cash', CASH))
+        strategy = params.get('strategy') or DEFAULT_STRATEGY
+        if strategy not in STRATEGIES:
+            return jsonify({"error": f"未知的策略: {strategy}"}), 400
+        n_simulations = int(params.get('n_simulations', 2000))
+        train_days = int(params.get('train_days', 504))
+        test_days = int(params.get('test_days', 126))
+        if not 1 <= n_simulations <= MAX_SIMULATIONS:
+            return jsonify({"error": f"n_simulations 必須介於 1 與 {MAX_SIMULATIONS} 之間"}), 400
+        if train_days < 1 or test_days < 1:
+            return jsonify({"error": "train_days 與 test_days 必須至少為 1"}), 400
+
+        df = get_historical_data_range(_normalize_stock_id(stock_id), start_date, end_date, strategy)
+        if df is None or len(df) < 2:
+            return jsonify({"error": "無法從 yfinance 下載資料或指標計算失敗（資料不足）"}), 400
+
+        results = run_robustness_analysis(
+            df, initial_cash, stock_id, strategy,
+            n_simulations=n_simulations,
+            block_size=max(1, int(params.get('block_size', 20))),
+            seed=int(params.get('seed', 42)),
+            train_days=train_days,
+            test_days=test_days,
+        )
+        return jsonify(results)
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"穩健性分析 API 發生錯誤: {e}")
+        logging.error(traceback.format_exc())
+        return jsonify({"error": "穩健性分析時發生內部錯誤"}), 500
@@ -2,32 +2,34 @@
 # --- routes/dashboard.py：首頁路由與儀表板資料組裝 ---
 import logging
 from flask import Blueprint, render_template
-from config import CASH, API_SECRET_KEY
+from config import CASH, API_SECRET_KEY, DEFAULT_STRATEGY
 from database import db
-from trading.data_fetcher import get_latest_price_info
-from trading.strategy import calculate_latest_signal
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 
 def get_live_dashboard_data() -> dict:
     """組裝即時儀表板所需的所有資料。"""
-    # 延遲匯入以避免循環依賴（executor → db → dashboard 可能的循環）
+    # 延遲匯入以避免循環依賴（executor → db → dashboard 可能的循環），
+    # 同時讓 pandas / yfinance 在第一次請求時才載入，不拖慢 worker 啟動
     from trading.executor import get_current_portfolio
+    from trading.data_fetcher import get_latest_price_info
+    from trading.strategy import calculate_latest_signal
 
     stock_id = db.get_setting('live_stock_id') or '2330.TW'
     stock_specific_cash_key = f"initial_cash_{stock_id}"
     initial_cash = db.get_setting(stock_specific_cash_key) or CASH
+    strategy = db.get_setting('live_strategy') or DEFAULT_STRATEGY
 
     trades = db.get_trades(stock_id)
     performance = db.get_performance(stock_id)
 
     latest_price, latest_signal = "N/A", "N/A"
     try:
-        price, _, _, df = get_latest_price_info(stock_id)
+        price, _, df = get_latest_price_info(stock_id, strategy)
         if price is not None:
             latest_price = price
-            latest_signal = calculate_latest_signal(df)
+            latest_signal = calculate_latest_signal(df, strategy)
     except Exception as e:
         logging.error(f"❌ 獲取儀表板即時數據時發生錯誤: {e}")
 
@@ -47,7 +49,8 @@ def get_live_dashboard_data() -> dict:
         "latest_signal": latest_signal,
         "total_asset": total_asset,
         "stock_id": stock_id,
-        "initial_cash": initial_cash
+        "initial_cash": initial_cash,
+        "strategy": strategy
     }
 
 
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# --- routes/events.py：Server-Sent Events 端點（儀表板即時推播）---
+import json
+import queue
+import time
+from flask import Blueprint, Response, jsonify, stream_with_context
+from config import SSE_MAX_STREAM_SECONDS, SSE_MAX_SUBSCRIBERS
+from event_bus import subscribe, unsubscribe
+
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_SECONDS = 15
+
+
+@events_bp.route('/api/events')
+def stream_events():
+    """
+    以 SSE 持續推送交易任務事件（trades / performance / signal）。
+
+    閒置時每 15 秒送出註解行作為心跳，避免代理伺服器切斷連線。
+
+    每條連線佔用一個 worker 執行緒，因此連線在 SSE_MAX_STREAM_SECONDS 後由伺服器結束
+    （瀏覽器依 retry 自動重連），且每個 worker 超過 SSE_MAX_SUBSCRIBERS 條連線時返回 503。
+    """
+    q = subscribe(SSE_MAX_SUBSCRIBERS)
+    if q is None:
+        return jsonify({"error": "即時推播連線數已達上限，請稍後再試"}), 503
+
+    def generate():
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    message = q.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['event']}\ndata: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+        finally:
+            unsubscribe(q)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # 客戶端在第一個位元組送出前就斷線時 generate 不會執行，仍須釋放名額
+    response.call_on_close(lambda: unsubscribe(q))
+    return response
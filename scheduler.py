@@ -1,13 +1,104 @@
 # -*- coding: utf-8 -*-
 # --- APScheduler 排程任務 ---
 import logging
+import threading
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
+from database import db
 
+SCHEDULER_LOCK_ID = 726_002  # pg_try_advisory_lock 的識別碼，確保只有一個 worker 執行排程
+LOCK_RETRY_SECONDS = 30      # 未取得排程鎖的 worker 重試間隔，也是持有者檢查鎖連線的間隔
 
-def start_scheduler(trading_job_func):
-    """建立並啟動背景定時排程，每週一至週五 13:30 執行交易任務。"""
+
+def run_trading_job():
+    """
+    排程呼叫的交易任務。
+
+    交易模組（pandas / yfinance）在函式內才匯入：APScheduler 在 add_job 時就會解析
+    'module:function' 字串，直接傳入字串參照會在 worker 啟動時載入這些模組。
+    """
+    from trading.executor import run_trading_job as job
+    job()
+
+
+def run_bar_store_update():
+    """
+    排程呼叫的分K累積任務：把監控標的近 7 天的 1 分K 附加到本地分K資料庫。
+
+    yfinance 的 1 分K 只保留最近 7 天，必須每日執行才能累積分K回測所需的長期歷史。
+    """
+    from trading.bar_store import update_intraday_bars
+    stock_id = db.get_setting('live_stock_id') or "2330.TW"
+    try:
+        update_intraday_bars(stock_id)
+    except Exception as e:
+        logging.error(f"❌ 更新 {stock_id} 分K資料失敗: {e}")
+
+
+def _try_lock(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (SCHEDULER_LOCK_ID,))
+        return cur.fetchone()[0]
+
+
+def _lock_alive(conn) -> bool:
+    """確認持有鎖的連線仍然可用；連線中斷時 session 級 advisory lock 已被釋放。"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
+def _create_scheduler() -> BackgroundScheduler:
     scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Taipei'))
-    scheduler.add_job(trading_job_func, 'cron', day_of_week='mon-fri', hour=13, minute=30)
-    scheduler.start()
-    logging.info("⏰ APScheduler 背景定時任務已啟動 (排程時間: 每週一至週五 13:30)")
+    scheduler.add_job(run_trading_job, 'cron', day_of_week='mon-fri', hour=13, minute=30)
+    scheduler.add_job(run_bar_store_update, 'cron', day_of_week='mon-fri', hour=14, minute=0)
+    scheduler.add_job(db.run_partition_maintenance, 'cron', hour=1, minute=0)
+    return scheduler
+
+
+def _scheduler_leader_loop(stop_event: threading.Event):
+    """
+    以 session 級 advisory lock 選出唯一的排程 worker。
+
+    未取得鎖的 worker 每 LOCK_RETRY_SECONDS 秒重試一次，因此持有鎖的 worker 結束
+    （單獨重啟、或零停機部署時舊容器被停止）後，其他仍在運作的 worker 會接手。
+    取得鎖後持續檢查鎖連線；連線中斷時停止排程並重新競爭，避免兩個 worker 同時排程。
+    """
+    while not stop_event.is_set():
+        conn, scheduler = None, None
+        try:
+            conn = db.get_db_connection()
+            conn.autocommit = True
+            if _try_lock(conn):
+                scheduler = _create_scheduler()
+                scheduler.start()
+                logging.info("⏰ APScheduler 背景定時任務已啟動 (排程時間: 交易任務每週一至週五 13:30、分K累積 14:00；分區維護每日 01:00)")
+                while not stop_event.wait(LOCK_RETRY_SECONDS) and _lock_alive(conn):
+                    pass
+                if not stop_event.is_set():
+                    logging.warning("⚠️ 排程鎖連線中斷，停止本 worker 的排程並重新競爭")
+        except Exception as e:
+            logging.warning(f"⚠️ 無法取得排程鎖（{e}），{LOCK_RETRY_SECONDS} 秒後重試")
+        finally:
+            if scheduler is not None:
+                scheduler.shutdown(wait=False)
+            if conn is not None:
+                conn.close()
+        stop_event.wait(LOCK_RETRY_SECONDS)
+
+
+def start_scheduler() -> threading.Event:
+    """
+    在背景執行緒競爭排程鎖，取得後啟動排程：每週一至週五 13:30 執行交易任務、
+    14:00 累積監控標的的分K，每日 01:00 執行資料表分區維護。多個 worker 中同一時間只有一個會執行排程。
+
+    Returns:
+        threading.Event: set() 後停止競爭並關閉本 worker 的排程
+    """
+    stop_event = threading.Event()
+    threading.Thread(target=_scheduler_leader_loop, args=(stop_event,),
+                     name='scheduler-leader', daemon=True).start()
+    return stop_event
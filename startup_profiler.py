@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# --- startup_profiler.py：記錄 worker 啟動時各模組匯入與初始化步驟的耗時 ---
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# 應延遲到第一次使用才載入的重量級模組；啟動報告會列出它們是否已被提前匯入
+HEAVY_MODULES = ('pandas', 'numpy', 'yfinance', 'numexpr')
+
+_records = []
+
+
+@contextmanager
+def timed(label: str):
+    """量測區塊耗時並記錄到啟動報告。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _records.append((label, (time.perf_counter() - start) * 1000))
+
+
+def get_startup_report() -> dict:
+    """返回本 worker 的啟動耗時報告（毫秒）。"""
+    return {
+        'pid': os.getpid(),
+        'steps': [{'step': label, 'ms': round(ms, 1)} for label, ms in _records],
+        'total_ms': round(sum(ms for _, ms in _records), 1),
+        'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def log_startup_report():
+    report = get_startup_report()
+    logging.info(f"⏱️ Worker {report['pid']} 啟動耗時 {report['total_ms']} ms")
+    for step in report['steps']:
+        logging.info(f"   - {step['step']}: {step['ms']} ms")
+    if report['heavy_modules_loaded']:
+        logging.warning(f"⚠️ 啟動時已載入重量級模組: {', '.join(report['heavy_modules_loaded'])}")
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# --- trading/backtest.py：單一標的日線回測模擬 ---
+import numpy as np
+from config import STOP_LOSS_PCT, TAKE_PROFIT_PCT
+from trading.strategy import get_strategy, apply_signals_to_dataframe, exit_condition
+
+
+def run_backtest(df, initial_cash: float, stock_id: str, strategy: str = None,
+                 stop_loss_pct: float = STOP_LOSS_PCT, take_profit_pct: float = TAKE_PROFIT_PCT) -> dict:
+    """
+    對已計算指標的日線 DataFrame 執行回測。
+
+    每日依序檢查：1. 停損  2. 固定停利  3. 策略出場（例如跌破 MA50）  4. 新突破買入
+    （持倉中且價格高於成本時以剩餘現金加碼）。停損 / 停利比例預設取自 config，
+    穩健性分析會傳入其他值做比較。
+
+    Returns:
+        dict: {'daily_assets': list, 'trade_log': list,
+               'insufficient_funds': bool, 'last_insufficient_price': float}
+    """
+    strategy_def = get_strategy(strategy)
+    df = apply_signals_to_dataframe(df.copy(), strategy)
+    prices = df['close'].to_numpy(float)
+    buy_signals = (df['signal'] == '買入').to_numpy()
+
+    cash, position, avg_cost = float(initial_cash), 0, 0.0
+    strategy_exit = np.zeros(len(df), dtype=bool)
+    daily_assets, trade_log = [], []
+    insufficient_funds = False
+    last_insufficient_price = 0
+
+    def record(i, action, shares, price, profit):
+        trade_log.append({
+            'timestamp': str(df.index[i].date()), 'stock_id': stock_id,
+            'action': action, 'shares': shares,
+            'price': price, 'total_value': price * shares,
+            'profit': profit
+        })
+
+    for i, price in enumerate(prices):
+        action_taken = False
+
+        # 1. 停損 / 停利 檢查
+        if position > 0:
+            if price < avg_cost * (1 - stop_loss_pct):
+                action = '停損賣出'
+            elif price > avg_cost * (1 + take_profit_pct):
+                action = f'獲利了結(滿足{take_profit_pct:.0%})'
+            elif strategy_exit[i]:
+                action = strategy_def['exit_label']
+            else:
+                action = None
+
+            if action:
+                record(i, action, position, price, (price - avg_cost) * position)
+                cash += price * position
+                position, avg_cost = 0, 0.0
+                action_taken = True
+
+        # 2. 買入訊號處理
+        if not action_taken and buy_signals[i]:
+            if position == 0 or price > avg_cost:
+                shares_to_buy = int(cash // price)
+                if shares_to_buy > 0:
+                    new_total = avg_cost * position + price * shares_to_buy
+                    position += shares_to_buy
+                    cash -= price * shares_to_buy
+                    avg_cost = new_total / position
+                    # 策略出場條件依賴持倉成本，成本改變時整段重新向量化計算
+                    strategy_exit = exit_condition(df, avg_cost, strategy)
+                    record(i, '執行買入', shares_to_buy, price, None)
+                elif position == 0:
+                    insufficient_funds = True
+                    last_insufficient_price = price
+
+        daily_assets.append(cash + position * price)
+
+    return {
+        'daily_assets': daily_assets,
+        'trade_log': trade_log,
+        'insufficient_funds': insufficient_funds,
+        'last_insufficient_price': last_insufficient_price
+    }
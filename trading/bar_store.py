@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# --- trading/bar_store.py：本地分K資料庫（每檔股票一個依時間排序的 CSV 檔）---
+import logging
+import os
+import pandas as pd
+from config import BAR_STORE_DIR, TRADING_MINUTES_PER_DAY
+from trading.fetch_coordinator import fetch_history
+
+BAR_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def get_bar_path(stock_id: str, interval: str = '1m') -> str:
+    """返回指定股票、K 線週期的本地 CSV 路徑，例如 data/bars/2330.TW_1m.csv。"""
+    return os.path.join(BAR_STORE_DIR, f"{stock_id}_{interval}.csv")
+
+
+def bars_per_day(interval: str) -> int:
+    """將 K 線週期（'1m'、'5m'、'60m'…）換算為每個交易日的 K 棒數。"""
+    if not interval.endswith('m'):
+        raise ValueError(f"不支援的分K週期: {interval}")
+    return max(1, TRADING_MINUTES_PER_DAY // int(interval[:-1]))
+
+
+def _read_last_timestamp(path: str):
+    """只讀取檔案最後一行，取得已儲存的最新時間（避免載入整個檔案）。"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        if pos == 0:
+            return None
+        # 從檔尾往回找上一個換行（跳過結尾的換行字元）
+        pos -= 1
+        while pos > 0:
+            pos -= 1
+            f.seek(pos)
+            if f.read(1) == b'\n':
+                pos += 1
+                break
+        f.seek(pos)
+        last_line = f.readline().decode('utf-8').strip()
+    if not last_line or last_line.startswith('timestamp'):
+        return None
+    return pd.Timestamp(last_line.split(',', 1)[0])
+
+
+def update_intraday_bars(stock_id: str, interval: str = '1m', period: str = '7d') -> int:
+    """
+    從 yfinance 下載近期分K，並只把比本地最新時間更新的 K 棒附加到 CSV 尾端。
+
+    yfinance 的 1 分K 只提供最近 7 天，需定期執行才能累積長期歷史。
+
+    Returns:
+        int: 新增的 K 棒數量
+    """
+    df = fetch_history(stock_id, period=period, interval=interval)
+    if df.empty:
+        logging.warning(f"無法從 yfinance 獲取 {stock_id} 的 {interval} 分K資料")
+        return 0
+
+    if df.index.tz:
+        df.index = df.index.tz_convert('Asia/Taipei').tz_localize(None)
+    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].rename(columns={
+        'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'
+    })
+    df.index.name = 'timestamp'
+
+    path = get_bar_path(stock_id, interval)
+    exists = os.path.exists(path)
+    if exists:
+        last_ts = _read_last_timestamp(path)
+        if last_ts is not None:
+            df = df[df.index > last_ts]
+    if df.empty:
+        return 0
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df.to_csv(path, mode='a', header=not exists, date_format='%Y-%m-%d %H:%M:%S')
+    logging.info(f"💾 已附加 {len(df)} 根 {stock_id} {interval} K 棒至 {path}")
+    return len(df)
+
+
+def iter_bar_chunks(stock_id: str, interval: str = '1m', end_date: str = None, chunksize: int = 100_000):
+    """
+    以固定大小的區塊逐段讀取本地分K，單次只在記憶體中保留一個區塊。
+
+    Yields:
+        DataFrame：以 timestamp 為索引的 open / high / low / close / volume
+    """
+    path = get_bar_path(stock_id, interval)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到 {stock_id} 的本地分K資料: {path}")
+
+    end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else None
+    reader = pd.read_csv(path, usecols=BAR_COLUMNS, parse_dates=['timestamp'],
+                         index_col='timestamp', chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            if end_ts is not None:
+                chunk = chunk[chunk.index < end_ts]
+                if chunk.empty:
+                    break
+            yield chunk
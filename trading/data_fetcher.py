@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 # --- trading/data_fetcher.py：yfinance 資料獲取與技術指標計算 ---
 import logging
-import yfinance as yf
+from trading.fetch_coordinator import fetch_history, INTERACTIVE
+from trading.strategy import required_indicators, compute_indicators, indicator_lookback
 
 
 def _normalize_stock_id(stock_id: str) -> str:
@@ -11,70 +12,58 @@ def _normalize_stock_id(stock_id: str) -> str:
     return stock_id
 
 
-def get_historical_data(stock_id: str):
+def _prepare_dataframe(df_raw, strategies):
+    """整理 yfinance 欄位名稱，並只計算指定策略需要的技術指標。"""
+    df = df_raw[['Open', 'High', 'Low', 'Close', 'Volume']].rename(columns={
+        'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'
+    })
+    indicators = required_indicators(strategies)
+    return compute_indicators(df, indicators), indicators
+
+
+def get_historical_data(stock_id: str, strategies=None):
     """
     下載近兩年股價資料並計算技術指標。
 
-    計算指標：
-    - SMA 50 / 150 / 200
-    - 52 週高點 / 低點
-    - SMA 200（20 個交易日前）
+    指標由策略註冊表宣告（預設策略為 Minervini：SMA 50 / 150 / 200、52 週高低點、
+    20 個交易日前的 SMA 200）；傳入多個策略名稱時，共用的指標只計算一次。
 
     Returns:
         DataFrame 或 None（無資料時）
     """
-    ticker = yf.Ticker(stock_id)
-    df = ticker.history(period="2y")
-    if df.empty:
+    df_raw = fetch_history(stock_id, period="2y")
+    if df_raw.empty:
         return None
 
-    df.index = df.index.tz_convert('Asia/Taipei')
-    df = df[['Open', 'High', 'Low', 'Close', 'Volume']].rename(columns={
-        'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'
-    })
-
-    df['sma_50'] = df['close'].rolling(window=50).mean()
-    df['sma_150'] = df['close'].rolling(window=150).mean()
-    df['sma_200'] = df['close'].rolling(window=200).mean()
-    df['52w_high'] = df['high'].rolling(window=252).max()
-    df['52w_low'] = df['low'].rolling(window=252).min()
-    df['sma_200_20d_ago'] = df['sma_200'].shift(20)
-
+    df_raw.index = df_raw.index.tz_convert('Asia/Taipei')
+    df, _ = _prepare_dataframe(df_raw, strategies)
     return df
 
 
-def get_historical_data_range(stock_id: str, start_date: str, end_date: str):
+def get_historical_data_range(stock_id: str, start_date: str, end_date: str, strategies=None, lane: str = INTERACTIVE):
     """
     下載指定日期範圍的股價資料並計算技術指標（用於回測）。
-    自動往前多抓兩年資料確保指標計算正確，最後過濾回指定範圍。
+    自動往前多抓至少兩年資料（或最長指標所需天數）確保指標計算正確，最後過濾回指定範圍。
+    多標的批次載入時傳入 lane=BULK，使用與即時請求分開的速率限制。
 
     Returns:
         DataFrame 或 None（無資料或指標計算失敗時）
     """
     import pandas as pd
 
-    ticker = yf.Ticker(stock_id)
-    extended_start = (pd.to_datetime(start_date) - pd.DateOffset(years=2)).strftime('%Y-%m-%d')
-    df_raw = ticker.history(start=extended_start, end=end_date)
+    warmup_days = max(730, int(indicator_lookback(required_indicators(strategies)) * 365 / 252) + 30)
+    extended_start = (pd.to_datetime(start_date) - pd.Timedelta(days=warmup_days)).strftime('%Y-%m-%d')
+    df_raw = fetch_history(stock_id, lane, start=extended_start, end=end_date)
 
     if df_raw.empty:
         return None
 
-    df = df_raw[['Open', 'High', 'Low', 'Close', 'Volume']].rename(columns={
-        'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'
-    })
-
-    if df.index.tz:
-        df.index = df.index.tz_localize(None)
+    if df_raw.index.tz:
+        df_raw.index = df_raw.index.tz_localize(None)
 
-    df['sma_50'] = df['close'].rolling(window=50).mean()
-    df['sma_150'] = df['close'].rolling(window=150).mean()
-    df['sma_200'] = df['close'].rolling(window=200).mean()
-    df['52w_high'] = df['high'].rolling(window=252).max()
-    df['52w_low'] = df['low'].rolling(window=252).min()
-    df['sma_200_20d_ago'] = df['sma_200'].shift(20)
+    df, indicators = _prepare_dataframe(df_raw, strategies)
 
-    if df['sma_200'].isnull().all():
+    if df[list(indicators)].isnull().all().any():
         return None
 
     # 過濾回真正要求的日期範圍
@@ -82,21 +71,20 @@ def get_historical_data_range(stock_id: str, start_date: str, end_date: str):
     return df
 
 
-def get_latest_price_info(stock_id: str):
+def get_latest_price_info(stock_id: str, strategies=None):
     """
-    取得股票最新價格、資料時間、MA50。
+    取得股票最新價格、資料時間與含指標的 DataFrame。
 
     Returns:
-        tuple: (latest_price, latest_time, latest_ma50, df)
-        失敗時返回 (None, None, None, None)
+        tuple: (latest_price, latest_time, df)
+        失敗時返回 (None, None, None)
     """
     stock_id = _normalize_stock_id(stock_id)
-    df = get_historical_data(stock_id)
+    df = get_historical_data(stock_id, strategies)
     if df is None or df.empty:
         logging.warning(f"無法從 yfinance 獲取 {stock_id} 的資料")
-        return None, None, None, None
+        return None, None, None
 
     latest_price = df['close'].iloc[-1]
     latest_time = df.index[-1]
-    latest_ma50 = df['sma_50'].iloc[-1]
-    return latest_price, latest_time, latest_ma50, df
+    return latest_price, latest_time, df
@@ -2,16 +2,20 @@
 # --- trading/executor.py：交易執行、停損停利、持倉計算 ---
 import logging
 import pandas as pd
-from config import CASH, STOP_LOSS_PCT, TAKE_PROFIT_PCT
+from config import CASH, STOP_LOSS_PCT, TAKE_PROFIT_PCT, DEFAULT_STRATEGY
 from database import db
+from database.partitions import replay_trades
+from event_bus import publish_event
 from trading.data_fetcher import get_latest_price_info
-from trading.strategy import calculate_latest_signal
+from trading.strategy import calculate_latest_signal, exit_condition, get_strategy
 
 
 def get_current_portfolio(stock_id: str) -> dict:
     """
     根據歷史交易紀錄計算目前的持倉狀態。
 
+    已歸檔分區的交易累積在持倉檢查點中，這裡只重播檢查點之後的交易。
+
     Returns:
         dict: {'cash': float, 'position': int, 'avg_cost': float}
     """
@@ -19,24 +23,16 @@ def get_current_portfolio(stock_id: str) -> dict:
     initial_cash_str = db.get_setting(stock_specific_cash_key)
     initial_cash = int(initial_cash_str) if initial_cash_str else CASH
 
-    trades = db.get_buy_sell_trades(stock_id)
-    portfolio = {'cash': initial_cash, 'position': 0, 'avg_cost': 0}
-
-    for trade in trades:
-        if trade['action'] == "執行買入":
-            trade_cost = float(trade['price']) * int(trade['shares'])
-            old_total = portfolio['avg_cost'] * portfolio['position']
-            new_total = old_total + trade_cost
-            portfolio['position'] += int(trade['shares'])
-            portfolio['cash'] -= trade_cost
-            if portfolio['position'] > 0:
-                portfolio['avg_cost'] = new_total / portfolio['position']
-        elif "賣出" in trade['action']:
-            portfolio['cash'] += float(trade['price']) * int(trade['shares'])
-            portfolio['position'] = 0
-            portfolio['avg_cost'] = 0
+    checkpoint = db.get_portfolio_checkpoint(stock_id)
+    if checkpoint:
+        portfolio = {'cash': initial_cash + checkpoint['cash_delta'],
+                     'position': checkpoint['position'], 'avg_cost': checkpoint['avg_cost']}
+        trades = db.get_buy_sell_trades(stock_id, since=checkpoint['as_of'])
+    else:
+        portfolio = {'cash': initial_cash, 'position': 0, 'avg_cost': 0}
+        trades = db.get_buy_sell_trades(stock_id)
 
-    return portfolio
+    return replay_trades(portfolio, trades)
 
 
 def execute_trade(timestamp, signal: str, price: float, portfolio: dict, stock_id: str):
@@ -79,12 +75,12 @@ def check_stop_loss(timestamp, price: float, portfolio: dict, stock_id: str) ->
     return False
 
 
-def check_take_profit(timestamp, price: float, ma50, portfolio: dict, stock_id: str) -> bool:
+def check_take_profit(timestamp, price: float, portfolio: dict, stock_id: str, df, strategy: str = None) -> bool:
     """
     檢查是否觸發停利。
 
     條件一：達到固定 30% 獲利目標
-    條件二：跌破 MA50 且目前為帳面獲利（動態保本停利）
+    條件二：策略的出場規則於最新一筆資料成立（Minervini 為跌破 MA50 且帳面獲利的動態保本停利）
 
     Returns:
         bool: True 表示已停利賣出
@@ -99,17 +95,39 @@ def check_take_profit(timestamp, price: float, ma50, portfolio: dict, stock_id:
             )
             return True
 
-        if ma50 is not None and price < ma50 and price > portfolio['avg_cost']:
+        if exit_condition(df.iloc[-1:], portfolio['avg_cost'], strategy)[0]:
+            exit_label = get_strategy(strategy)['exit_label']
             profit = (price - portfolio['avg_cost']) * portfolio['position']
-            db.log_trade(timestamp, stock_id, "動態停利(跌破MA50)", portfolio['position'], price, profit)
+            db.log_trade(timestamp, stock_id, exit_label, portfolio['position'], price, profit)
             logging.info(
-                f"🛡️【動態保本】時間 {timestamp.strftime('%Y-%m-%d %H:%M')}! 跌破季線(MA50)，提前獲利了結。"
+                f"🛡️【策略出場】時間 {timestamp.strftime('%Y-%m-%d %H:%M')}! {exit_label}。"
             )
             return True
 
     return False
 
 
+def publish_job_events(stock_id: str, last_trade_id: int, check_timestamp, price: float,
+                       signal: str, total_asset: float):
+    """
+    交易任務完成後，推播增量事件給儀表板：新交易紀錄、最新績效點、最新訊號。
+
+    推播失敗只記錄錯誤，不影響交易任務本身的結果。
+    """
+    try:
+        new_trades = [dict(row) for row in db.get_trades_after(stock_id, last_trade_id, since=check_timestamp.strftime('%Y-%m-%d'))]
+        if new_trades:
+            publish_event('trades', {'stock_id': stock_id, 'trades': new_trades})
+        publish_event('performance', {
+            'stock_id': stock_id, 'date': str(check_timestamp.date()), 'asset_value': float(total_asset)
+        })
+        publish_event('signal', {
+            'stock_id': stock_id, 'latest_price': price, 'latest_signal': signal, 'total_asset': float(total_asset)
+        })
+    except Exception as e:
+        logging.error(f"❌ 推播即時事件失敗: {e}")
+
+
 def run_trading_job() -> dict:
     """
     完整交易排程任務（由 APScheduler 呼叫或手動觸發）。
@@ -124,34 +142,36 @@ def run_trading_job() -> dict:
     """
     import traceback
     stock_id = db.get_setting('live_stock_id') or "2330.TW"
+    strategy = db.get_setting('live_strategy') or DEFAULT_STRATEGY
     try:
         check_timestamp = pd.Timestamp.now(tz='Asia/Taipei')
         logging.info(
             f"🤖 API被觸發，開始檢查 {stock_id} at {check_timestamp.strftime('%Y-%m-%d %H:%M:%S')}..."
         )
 
-        latest_price, data_timestamp, ma50, df = get_latest_price_info(stock_id)
-        if latest_price is None or data_timestamp is None or ma50 is None or df is None:
+        latest_price, data_timestamp, df = get_latest_price_info(stock_id, strategy)
+        if latest_price is None or data_timestamp is None or df is None:
             return {"status": "error", "message": "無法獲取最新價格資料"}
 
         price_f: float = float(latest_price)
-        ma50_f: float = float(ma50)
 
-        signal = calculate_latest_signal(df)
+        signal = calculate_latest_signal(df, strategy)
         logging.info(
             f"   - 資料時間: {data_timestamp.strftime('%Y-%m-%d %H:%M')}, "
-            f"最新價格: {price_f:.2f}, MA50: {ma50_f:.2f}, 日線訊號: {signal}"
+            f"最新價格: {price_f:.2f}, 策略: {strategy}, 日線訊號: {signal}"
         )
 
+        last_trade_id = db.get_latest_trade_id(stock_id)
         portfolio = get_current_portfolio(stock_id)
 
         if not check_stop_loss(check_timestamp, price_f, portfolio, stock_id):
-            if not check_take_profit(check_timestamp, price_f, ma50_f, portfolio, stock_id):
+            if not check_take_profit(check_timestamp, price_f, portfolio, stock_id, df, strategy):
                 execute_trade(check_timestamp, signal, price_f, portfolio, stock_id)
 
         final_portfolio = get_current_portfolio(stock_id)
         total_asset = final_portfolio['cash'] + (final_portfolio['position'] * price_f)
         db.log_performance(check_timestamp.date(), stock_id, total_asset)
+        publish_job_events(stock_id, last_trade_id, check_timestamp, price_f, signal, total_asset)
 
         message = f"檢查完成。總資產: {total_asset:,.2f}"
         return {"status": "success", "message": message}
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# --- trading/fetch_coordinator.py：yfinance 請求合併、速率限制與重試 ---
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from config import (YF_RATE_PER_SEC, YF_BURST, YF_MAX_RETRIES, YF_BACKOFF_BASE, YF_BACKOFF_CAP,
+                    YF_BULK_RATE_PER_SEC, YF_BULK_BURST, YF_BULK_MAX_RETRIES, YF_EMPTY_RANGE_RETRIES)
+
+# 請求通道：即時交易與儀表板走 interactive，批次回測下載走 bulk，兩者各自擁有令牌桶
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+
+def _is_empty(result) -> bool:
+    """yfinance 在被限流或查無資料時常返回空 DataFrame 而不拋出例外。"""
+    return result is None or getattr(result, 'empty', False)
+
+
+class _TokenBucket:
+    """執行緒安全的令牌桶；令牌不足時以注入的 sleep 等待。"""
+
+    def __init__(self, rate_per_sec: float, burst: int, sleep, clock):
+        self._rate = rate_per_sec
+        self._burst = burst
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = clock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            self._sleep(wait)
+
+
+class FetchCoordinator:
+    """
+    位於資料供應端（provider）前的協調器，負責：
+
+    1. Single-flight：同一 (ticker, 參數) 同時間只送出一次請求，其餘呼叫者等待同一結果
+    2. Token bucket：限制每秒送往供應端的請求數，允許短暫突發；interactive 與 bulk
+       兩個通道各自擁有令牌桶，批次回測大量下載時不會排擠即時交易與儀表板的請求
+    3. 重試：例外或空結果時以 full-jitter 指數退避重試；以 start / end 指定日期範圍的
+       請求返回空資料可能是被限流，也可能是該區間確實沒有資料（已下市、尚未上市），
+       因此只重試 empty_range_retries 次，避免每個缺資料的標的都耗盡完整的重試次數
+
+    provider、sleep、clock、rng 皆可注入，便於以假的供應端測試。
+    每個 gunicorn worker 各自擁有一個實例。
+    """
+
+    def __init__(self, provider, rate_per_sec: float = YF_RATE_PER_SEC, burst: int = YF_BURST,
+                 max_retries: int = YF_MAX_RETRIES, backoff_base: float = YF_BACKOFF_BASE,
+                 backoff_cap: float = YF_BACKOFF_CAP, bulk_rate_per_sec: float = YF_BULK_RATE_PER_SEC,
+                 bulk_burst: int = YF_BULK_BURST, bulk_max_retries: int = YF_BULK_MAX_RETRIES,
+                 empty_range_retries: int = YF_EMPTY_RANGE_RETRIES,
+                 sleep=time.sleep, clock=time.monotonic, rng=None):
+        self._provider = provider
+        self._buckets = {
+            INTERACTIVE: _TokenBucket(rate_per_sec, burst, sleep, clock),
+            BULK: _TokenBucket(bulk_rate_per_sec, bulk_burst, sleep, clock),
+        }
+        self._max_retries = {INTERACTIVE: max_retries, BULK: bulk_max_retries}
+        self._empty_range_retries = empty_range_retries
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._waiting = {INTERACTIVE: 0, BULK: 0}
+        self._counters = {'requests': 0, 'coalesced': 0, 'provider_calls': 0, 'retries': 0,
+                          'empty_range_retries': 0, 'failures': 0}
+
+    def fetch(self, ticker: str, lane: str = INTERACTIVE, **params):
+        """
+        取得資料；若相同請求正在進行中，直接等待其結果而不另外發送。
+
+        合併只發生在同一通道內，interactive 呼叫者不會排在 bulk 請求的令牌等待之後。
+        """
+        key = (lane, ticker, tuple(sorted(params.items())))
+        with self._lock:
+            self._counters['requests'] += 1
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._counters['coalesced'] += 1
+
+        if is_leader:
+            try:
+                future.set_result(self._fetch_with_retry(ticker, lane, params))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+        return future.result()
+
+    def stats(self) -> dict:
+        """返回目前進行中的請求數、各通道等待令牌的佇列深度與累計計數。"""
+        with self._lock:
+            return {'in_flight': len(self._in_flight), 'queue_depth': dict(self._waiting), **self._counters}
+
+    def _acquire_token(self, lane: str):
+        """從該通道的令牌桶取得一個令牌，不足時休眠至補滿一個為止。"""
+        with self._lock:
+            self._waiting[lane] += 1
+        try:
+            self._buckets[lane].acquire()
+        finally:
+            with self._lock:
+                self._waiting[lane] -= 1
+
+    def _fetch_with_retry(self, ticker: str, lane: str, params: dict):
+        result, error = None, None
+        max_retries = self._max_retries[lane]
+        is_range = 'start' in params
+        empty_retries = 0
+        for attempt in range(max_retries + 1):
+            self._acquire_token(lane)
+            with self._lock:
+                self._counters['provider_calls'] += 1
+            try:
+                result, error = self._provider(ticker, **params), None
+                if not _is_empty(result):
+                    return result
+            except Exception as e:
+                error = e
+
+            if attempt == max_retries:
+                break
+            if error is None and is_range:
+                if empty_retries >= self._empty_range_retries:
+                    break
+                empty_retries += 1
+                with self._lock:
+                    self._counters['empty_range_retries'] += 1
+            delay = self._rng.uniform(0, min(self._backoff_cap, self._backoff_base * 2 ** attempt))
+            logging.warning(
+                f"⚠️ {ticker} 資料請求{'失敗: ' + str(error) if error else '返回空資料'}，"
+                f"{delay:.2f} 秒後重試（第 {attempt + 1}/{max_retries} 次）"
+            )
+            with self._lock:
+                self._counters['retries'] += 1
+            self._sleep(delay)
+
+        with self._lock:
+            self._counters['failures'] += 1
+        if error is not None:
+            raise error
+        return result
+
+
+def _yfinance_history(ticker: str, **params):
+    import yfinance as yf
+    return yf.Ticker(ticker).history(**params)
+
+
+_coordinator = FetchCoordinator(_yfinance_history)
+
+
+def fetch_history(ticker: str, lane: str = INTERACTIVE, **params):
+    """
+    透過全域協調器呼叫 yf.Ticker(ticker).history(**params)。
+
+    批次下載（例如投資組合回測載入數百檔標的）應傳入 lane=BULK。
+    每位呼叫者拿到各自的副本，避免共用結果時互相修改。
+    """
+    result = _coordinator.fetch(ticker, lane, **params)
+    return result.copy() if hasattr(result, 'copy') else result
+
+
+def get_fetch_stats() -> dict:
+    """返回全域協調器的統計資料。"""
+    return _coordinator.stats()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# --- trading/intraday_backtest.py：以區塊串流分K的低記憶體回測 ---
+import numpy as np
+import pandas as pd
+from config import STOP_LOSS_PCT, TAKE_PROFIT_PCT, INTRADAY_CHUNK_BARS
+from trading.bar_store import iter_bar_chunks, bars_per_day
+from trading.strategy import (get_strategy, required_indicators, indicator_lookback,
+                              compute_indicators, new_breakout_mask, exit_condition)
+
+
+def add_intraday_indicators(bars, per_day: int, strategy: str = None):
+    """
+    以 K 棒數計算策略宣告的技術指標，並標記新突破訊號。
+
+    所有視窗都乘上每日 K 棒數，例如 1 分K 的 SMA50 為 50 × 270 根 K 棒。
+    """
+    bars = compute_indicators(bars, required_indicators(strategy), bars_per_day=per_day)
+    bars['buy'] = new_breakout_mask(bars, strategy)
+    return bars
+
+
+def _simulate_chunk(bars, state: dict, start_ts, stock_id: str, trade_log: list, strategy: str = None):
+    """
+    在單一區塊內推進投資組合狀態，返回每根 K 棒收盤時的總資產。
+
+    不逐根迴圈：空手時直接跳到下一個買入訊號；持倉時以陣列一次找出第一根
+    觸發停損 / 停利 / 策略出場（或加碼）的 K 棒。停損停利以 K 棒高低點盤中觸發，
+    開盤跳空越過觸發價時以開盤價成交；同一根同時觸及時保守地視為先停損。
+    """
+    ts = bars.index
+    o, h, l, c = (bars[col].to_numpy(float) for col in ('open', 'high', 'low', 'close'))
+    exit_label = get_strategy(strategy)['exit_label']
+    buy = bars['buy'].to_numpy(bool) & (ts >= start_ts)
+    n = len(bars)
+    equity = np.empty(n)
+
+    def record(k, action, shares, price, profit):
+        trade_log.append({
+            'timestamp': ts[k].strftime('%Y-%m-%d %H:%M'), 'stock_id': stock_id,
+            'action': action, 'shares': int(shares),
+            'price': float(price), 'total_value': float(price * shares),
+            'profit': None if profit is None else float(profit)
+        })
+
+    def first_index(mask):
+        hits = np.flatnonzero(mask)
+        return hits[0] if hits.size else None
+
+    i = 0
+    while i < n:
+        cash, position, avg_cost = state['cash'], state['position'], state['avg_cost']
+
+        if position == 0:
+            k = first_index(buy[i:])
+            if k is None:
+                equity[i:] = cash
+                break
+            k += i
+            equity[i:k] = cash
+            shares = int(cash // c[k])
+            if shares > 0:
+                state.update(cash=cash - c[k] * shares, position=shares, avg_cost=c[k])
+                record(k, '執行買入', shares, c[k], None)
+            equity[k] = state['cash'] + state['position'] * c[k]
+            i = k + 1
+            continue
+
+        stop_price = avg_cost * (1 - STOP_LOSS_PCT)
+        take_price = avg_cost * (1 + TAKE_PROFIT_PCT)
+        seg = slice(i, n)
+        stop_hit = l[seg] < stop_price
+        take_hit = h[seg] > take_price
+        trail_hit = exit_condition(bars.iloc[seg], avg_cost, strategy)
+        add_hit = buy[seg] & (c[seg] > avg_cost) & (c[seg] <= cash)
+        k = first_index(stop_hit | take_hit | trail_hit | add_hit)
+        if k is None:
+            equity[i:] = cash + position * c[i:]
+            break
+        equity[i:i + k] = cash + position * c[i:i + k]
+        j = i + k
+
+        if stop_hit[k]:
+            action, fill = '停損賣出', min(o[j], stop_price)
+        elif take_hit[k]:
+            action, fill = '獲利了結(滿足30%)', max(o[j], take_price)
+        elif trail_hit[k]:
+            action, fill = exit_label, c[j]
+        else:
+            action, fill = None, c[j]
+
+        if action:
+            record(j, action, position, fill, (fill - avg_cost) * position)
+            state.update(cash=cash + fill * position, position=0, avg_cost=0)
+        else:
+            # 加碼：與日線回測相同，僅在價格高於成本時用剩餘現金買入
+            shares = int(cash // fill)
+            new_position = position + shares
+            state.update(cash=cash - fill * shares, position=new_position,
+                         avg_cost=(avg_cost * position + fill * shares) / new_position)
+            record(j, '執行買入', shares, fill, None)
+        equity[j] = state['cash'] + state['position'] * c[j]
+        i = j + 1
+
+    return equity
+
+
+def run_intraday_backtest(stock_id: str, start_date: str, end_date: str, initial_cash: float,
+                          interval: str = '1m', chunksize: int = INTRADAY_CHUNK_BARS,
+                          strategy: str = None) -> dict:
+    """
+    從本地分K資料庫串流讀取 K 棒並執行回測。
+
+    每個區塊前面會接上前一區塊尾端的 K 棒（長度為策略最長指標視窗），讓均線與
+    52 週高低點等指標跨區塊連續計算。記憶體中最多只保留「一個區塊 + 指標視窗」，
+    與回測期間長短無關；資產曲線僅保留每日收盤值。
+
+    start_date 之前不會進場，因此整個落在 start_date 之前的區塊不計算指標、不模擬，
+    只把尾端 K 棒保留為 carry，作為第一個需要模擬的區塊的指標暖機資料。
+
+    Returns:
+        dict: {'chart_data': {'dates', 'values'}, 'trades': list}
+    """
+    per_day = bars_per_day(interval)
+    carry_len = max(indicator_lookback(required_indicators(strategy)), 1) * per_day
+    start_ts = pd.Timestamp(start_date)
+
+    state = {'cash': float(initial_cash), 'position': 0, 'avg_cost': 0.0}
+    daily_equity, trade_log = {}, []
+    carry = None
+
+    for chunk in iter_bar_chunks(stock_id, interval, end_date, chunksize):
+        raw = chunk if carry is None else pd.concat([carry, chunk])
+        if chunk.index[-1] < start_ts:
+            carry = raw.iloc[-carry_len:]
+            continue
+
+        bars = add_intraday_indicators(raw.copy(), per_day, strategy).iloc[-len(chunk):]
+        carry = raw.iloc[-carry_len:]
+
+        equity = _simulate_chunk(bars, state, start_ts, stock_id, trade_log, strategy)
+
+        in_range = bars.index >= start_ts
+        if in_range.any():
+            day_close = pd.Series(equity[in_range], index=bars.index[in_range].normalize())
+            daily_equity.update(day_close.groupby(level=0).last().to_dict())
+
+    dates = sorted(daily_equity)
+    return {
+        "chart_data": {
+            "dates": [d.strftime('%Y-%m-%d') for d in dates],
+            "values": [float(daily_equity[d]) for d in dates]
+        },
+        "trades": trade_log
+    }
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# --- trading/portfolio_backtest.py：多標的共用資金池的投資組合回測 ---
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from config import STOP_LOSS_PCT, TAKE_PROFIT_PCT, MAX_POSITIONS, POSITION_SIZE_PCT
+from trading.data_fetcher import get_historical_data_range, _normalize_stock_id
+from trading.fetch_coordinator import BULK
+from trading.strategy import get_strategy, new_breakout_mask, evaluate_rule, exit_condition
+
+# 出場條件的檢查順序與單一標的回測相同：停損 → 固定停利 → 策略出場
+RISK_EXIT_ACTIONS = ('停損賣出', '獲利了結(滿足30%)')
+
+
+def load_price_panel(stock_ids, start_date: str, end_date: str, strategy: str = None, max_workers: int = 8):
+    """
+    下載多檔股票資料，並對齊成「日期 × 標的」的 NumPy 陣列。
+
+    某標的在某日沒有資料（尚未上市、停牌）時，該格為 NaN / False，當日不可交易。
+    下載走協調器的 bulk 通道，不佔用即時交易與儀表板請求的速率額度。
+
+    Returns:
+        dict: {'dates', 'symbols', 'close', 'buy', 'score', 'fields'}
+        （fields 為策略出場規則引用的各欄位陣列）
+        全部下載失敗時返回 None
+    """
+    symbols = list(dict.fromkeys(_normalize_stock_id(s) for s in stock_ids))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda s: get_historical_data_range(s, start_date, end_date, strategy, BULK), symbols))
+
+    frames = {}
+    for symbol, df in zip(symbols, results):
+        if df is None or df.empty:
+            logging.warning(f"⚠️ 投資組合回測略過 {symbol}：無資料或指標計算失敗")
+            continue
+        frames[symbol] = df
+    if not frames:
+        return None
+
+    symbols = list(frames)
+    dates = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+
+    def stack(values_by_symbol, fill_value):
+        return np.column_stack([
+            values_by_symbol(frames[s]).reindex(dates, fill_value=fill_value).to_numpy() for s in symbols
+        ])
+
+    strategy_def = get_strategy(strategy)
+    exit_names = set(strategy_def['exit']['names']) - {'avg_cost'} if strategy_def['exit'] else set()
+    return {
+        'dates': dates,
+        'symbols': symbols,
+        'close': stack(lambda df: df['close'], np.nan).astype(float),
+        'buy': stack(lambda df: new_breakout_mask(df, strategy), False).astype(bool),
+        # 排序分數由策略宣告（Minervini 為距 52 週低點的漲幅），越強勢者越優先分配資金
+        'score': stack(lambda df: pd.Series(evaluate_rule(strategy_def['score'], df), index=df.index),
+                       np.nan).astype(float),
+        'fields': {name: stack(lambda df: df[name], np.nan).astype(float) for name in exit_names | {'close'}},
+    }
+
+
+def run_portfolio_backtest(panel: dict, initial_cash: float,
+                           max_positions: int = MAX_POSITIONS,
+                           position_pct: float = POSITION_SIZE_PCT, strategy: str = None) -> dict:
+    """
+    在共用資金池下模擬多標的投資組合。
+
+    每個交易日：
+    1. 對所有持倉以陣列運算檢查停損 / 停利 / 策略出場
+    2. 將當日出現新突破、且未持有的標的依分數排序
+    3. 在剩餘持倉檔數內，以「總資產 × position_pct」為上限依序買入
+
+    Returns:
+        dict: {'chart_data': {'dates', 'values'}, 'trades': list, 'final_equity': float}
+    """
+    dates, symbols = panel['dates'], panel['symbols']
+    close, buy, score, fields = panel['close'], panel['buy'], panel['score'], panel['fields']
+    exit_label = get_strategy(strategy)['exit_label']
+    n_days, n_symbols = close.shape
+
+    cash = float(initial_cash)
+    position = np.zeros(n_symbols, dtype=np.int64)
+    avg_cost = np.zeros(n_symbols)
+    last_price = np.full(n_symbols, np.nan)
+    equity_curve = np.empty(n_days)
+    trade_log = []
+
+    def record(day, j, action, shares, price, profit):
+        trade_log.append({
+            'timestamp': str(dates[day].date()), 'stock_id': symbols[j],
+            'action': action, 'shares': int(shares),
+            'price': float(price), 'total_value': float(price * shares),
+            'profit': None if profit is None else float(profit)
+        })
+
+    for t in range(n_days):
+        price = close[t]
+        tradable = ~np.isnan(price)
+        last_price = np.where(tradable, price, last_price)
+        held = (position > 0) & tradable
+
+        # 1. 停損 / 停利 檢查（NaN 比較為 False，停牌標的不會被觸發）
+        exited = np.zeros(n_symbols, dtype=bool)
+        if held.any():
+            stop = held & (price < avg_cost * (1 - STOP_LOSS_PCT))
+            take = held & ~stop & (price > avg_cost * (1 + TAKE_PROFIT_PCT))
+            row = {name: values[t] for name, values in fields.items()}
+            trail = held & ~stop & ~take & exit_condition(row, avg_cost, strategy)
+            for mask, action in zip((stop, take, trail), RISK_EXIT_ACTIONS + (exit_label,)):
+                for j in np.flatnonzero(mask):
+                    record(t, j, action, position[j], price[j], (price[j] - avg_cost[j]) * position[j])
+            exited = stop | take | trail
+            cash += float((price[exited] * position[exited]).sum())
+            position[exited] = 0
+            avg_cost[exited] = 0
+
+        # 2. 依分數排序新突破標的，從共用資金池分配
+        slots = max_positions - int(np.count_nonzero(position))
+        candidates = np.flatnonzero(buy[t] & tradable & (position == 0) & ~exited)
+        if slots > 0 and candidates.size:
+            ranked = candidates[np.argsort(-np.nan_to_num(score[t, candidates], nan=-np.inf), kind='stable')]
+            holdings_value = float(np.where(position > 0, position * last_price, 0).sum())
+            budget = (cash + holdings_value) * position_pct
+            for j in ranked[:slots]:
+                shares = int(min(budget, cash) // price[j])
+                if shares <= 0:
+                    continue
+                position[j] = shares
+                avg_cost[j] = price[j]
+                cash -= price[j] * shares
+                record(t, j, '執行買入', shares, price[j], None)
+
+        equity_curve[t] = cash + float(np.where(position > 0, position * last_price, 0).sum())
+
+    return {
+        "chart_data": {
+            "dates": [d.strftime('%Y-%m-%d') for d in dates],
+            "values": equity_curve.tolist()
+        },
+        "trades": trade_log,
+        "final_equity": float(equity_curve[-1]) if n_days else float(initial_cash)
+    }
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# --- trading/robustness.py：Walk-forward 與 Monte Carlo 穩健性分析（多行程平行）---
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+from config import STOP_LOSS_PCT, TAKE_PROFIT_PCT, ROBUSTNESS_WORKERS
+from trading.backtest import run_backtest
+
+PERCENTILES = (5, 25, 50, 75, 95)
+STOP_LOSS_GRID = (0.10, 0.15, 0.20)
+TAKE_PROFIT_GRID = (0.20, 0.30, 0.40)
+# 每批模擬固定筆數，批次的亂數種子由主種子衍生，結果與 CPU 核心數無關
+SIMULATION_BATCH_SIZE = 250
+MAX_SIMULATIONS = 20_000  # API 單次請求允許的 Monte Carlo 路徑上限
+
+
+def max_drawdown(equity: np.ndarray) -> np.ndarray:
+    """計算最大回撤（0.25 表示自高點下跌 25%）；equity 可為一維或「路徑 × 天數」的二維陣列。"""
+    running_peak = np.maximum.accumulate(equity, axis=-1)
+    return np.max(1 - equity / running_peak, axis=-1)
+
+
+def _summarize(equity, initial_cash: float) -> dict:
+    equity = np.asarray(equity, dtype=float)
+    return {
+        'final_equity': float(equity[-1]),
+        'total_return': float(equity[-1] / initial_cash - 1),
+        'max_drawdown': float(max_drawdown(equity)),
+    }
+
+
+def _percentiles(values: np.ndarray) -> dict:
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _simulate_batch(returns: np.ndarray, n_paths: int, block_size: int, initial_cash: float, seed_seq):
+    """
+    以區塊重抽樣（moving block bootstrap）產生 n_paths 條報酬路徑。
+
+    block_size = 1 時等同一般的 i.i.d. bootstrap；較長的區塊可保留報酬的自我相關與波動群聚。
+
+    Returns:
+        tuple: (final_equity, max_drawdown) 兩個長度為 n_paths 的陣列
+    """
+    rng = np.random.default_rng(seed_seq)
+    n_days = len(returns)
+    block_size = min(block_size, n_days)
+    n_blocks = -(-n_days // block_size)
+    starts = rng.integers(0, n_days - block_size + 1, size=(n_paths, n_blocks))
+    index = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :n_days]
+    equity = initial_cash * np.cumprod(1 + returns[index], axis=1)
+    return equity[:, -1], max_drawdown(equity)
+
+
+def _evaluate_split(df, train: slice, test: slice, initial_cash: float, stock_id: str, strategy: str) -> dict:
+    """
+    單一 walk-forward 切分：在訓練區間從停損 / 停利網格選出最終資產最高的組合，
+    再於測試區間（樣本外）與預設 15% / 30% 規則比較。
+    """
+    train_df, test_df = df.iloc[train], df.iloc[test]
+
+    def final_equity(stop_loss, take_profit):
+        return run_backtest(train_df, initial_cash, stock_id, strategy, stop_loss, take_profit)['daily_assets'][-1]
+
+    best_stop, best_take = max(product(STOP_LOSS_GRID, TAKE_PROFIT_GRID), key=lambda p: final_equity(*p))
+    tuned = run_backtest(test_df, initial_cash, stock_id, strategy, best_stop, best_take)['daily_assets']
+    baseline = run_backtest(test_df, initial_cash, stock_id, strategy)['daily_assets']
+
+    return {
+        'train_start': str(train_df.index[0].date()), 'train_end': str(train_df.index[-1].date()),
+        'test_start': str(test_df.index[0].date()), 'test_end': str(test_df.index[-1].date()),
+        'best_stop_loss': best_stop, 'best_take_profit': best_take,
+        'tuned': _summarize(tuned, initial_cash),
+        'baseline': _summarize(baseline, initial_cash),
+    }
+
+
+def walk_forward_splits(n_rows: int, train_days: int, test_days: int):
+    """產生滾動的 (訓練, 測試) 切分；每次往前推進一個測試區間長度。"""
+    if train_days < 1 or test_days < 1:
+        raise ValueError("train_days 與 test_days 必須至少為 1")
+    splits = []
+    start = 0
+    while start + train_days + test_days <= n_rows:
+        splits.append((slice(start, start + train_days), slice(start + train_days, start + train_days + test_days)))
+        start += test_days
+    return splits
+
+
+def run_robustness_analysis(df, initial_cash: float, stock_id: str, strategy: str = None,
+                            n_simulations: int = 2000, block_size: int = 20, seed: int = 42,
+                            train_days: int = 504, test_days: int = 126, max_workers: int = ROBUSTNESS_WORKERS) -> dict:
+    """
+    以回測模擬為基礎的穩健性分析。
+
+    1. 基準：對整段資料執行一次回測，取得每日資產曲線
+    2. Monte Carlo：將基準的日報酬區塊重抽樣成 n_simulations 條路徑，
+       統計最終資產與最大回撤的百分位數
+    3. Walk-forward：滾動切分訓練 / 測試區間，檢驗停損 / 停利參數在樣本外的表現
+
+    Monte Carlo 批次與 walk-forward 切分都分散到行程池執行；給定 seed 時結果完全可重現。
+
+    Returns:
+        dict: {'baseline', 'monte_carlo', 'walk_forward'}
+    """
+    base_equity = np.asarray(run_backtest(df, initial_cash, stock_id, strategy)['daily_assets'], dtype=float)
+    returns = base_equity[1:] / base_equity[:-1] - 1
+
+    batch_sizes = [SIMULATION_BATCH_SIZE] * (n_simulations // SIMULATION_BATCH_SIZE)
+    if n_simulations % SIMULATION_BATCH_SIZE:
+        batch_sizes.append(n_simulations % SIMULATION_BATCH_SIZE)
+    seed_seqs = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    splits = walk_forward_splits(len(df), train_days, test_days)
+
+    # gunicorn worker 內有其他執行緒，使用 spawn 避免 fork 時繼承鎖的狀態
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        mc_futures = [
+            pool.submit(_simulate_batch, returns, size, block_size, initial_cash, seq)
+            for size, seq in zip(batch_sizes, seed_seqs)
+        ] if len(returns) else []
+        wf_futures = [
+            # 只傳送該切分用到的資料列，減少序列化到子行程的量
+            pool.submit(_evaluate_split, df.iloc[train.start:test.stop], slice(0, train_days),
+                        slice(train_days, None), initial_cash, stock_id, strategy)
+            for train, test in splits
+        ]
+        mc_results = [f.result() for f in mc_futures]
+        walk_forward = [f.result() for f in wf_futures]
+
+    monte_carlo = {'n_simulations': n_simulations, 'block_size': block_size, 'seed': seed}
+    if mc_results:
+        final_equity = np.concatenate([r[0] for r in mc_results])
+        drawdowns = np.concatenate([r[1] for r in mc_results])
+        monte_carlo.update({
+            'final_equity_percentiles': _percentiles(final_equity),
+            'max_drawdown_percentiles': _percentiles(drawdowns),
+            'probability_of_loss': float(np.mean(final_equity < initial_cash)),
+        })
+
+    return {
+        'baseline': {**_summarize(base_equity, initial_cash),
+                     'stop_loss_pct': STOP_LOSS_PCT, 'take_profit_pct': TAKE_PROFIT_PCT},
+        'monte_carlo': monte_carlo,
+        'walk_forward': walk_forward,
+    }
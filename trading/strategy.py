@@ -1,32 +1,180 @@
 # -*- coding: utf-8 -*-
-# --- trading/strategy.py：買入訊號計算策略（Minervini 趨勢模板）---
+# --- trading/strategy.py：策略註冊表（宣告式指標 + 向量化進出場規則）---
+import numpy as np
+import pandas as pd
+from config import DEFAULT_STRATEGY
 
+try:
+    import numexpr
+except ImportError:  # numexpr 為選用套件，未安裝時以 NumPy 運算子求值
+    numexpr = None
 
-def is_buy_condition_met(row) -> bool:
+PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# 指標種類 → 計算方式；source 可以是價格欄位，也可以是其他已宣告的指標
+INDICATOR_KINDS = {
+    'sma': lambda s, w: s.rolling(window=w).mean(),
+    'ema': lambda s, w: s.ewm(span=w, adjust=False, min_periods=w).mean(),
+    'rolling_max': lambda s, w: s.rolling(window=w).max(),
+    'rolling_min': lambda s, w: s.rolling(window=w).min(),
+    'shift': lambda s, w: s.shift(w),
+}
+
+STRATEGIES = {}
+
+
+def _compile_rule(name: str, expr: str, allowed: set):
+    """編譯規則運算式，並確認只引用已宣告的指標、價格欄位或 avg_cost。"""
+    code = compile(expr, f'<strategy {name}>', 'eval')
+    unknown = set(code.co_names) - allowed
+    if unknown:
+        raise ValueError(f"策略 {name} 的規則引用了未宣告的名稱: {sorted(unknown)}")
+    return {'expr': expr, 'code': code, 'names': tuple(code.co_names)}
+
+
+def register_strategy(name: str, indicators: dict, entry: str, exit: str = None,
+                      exit_label: str = '策略出場', score: str = 'close', description: str = ''):
+    """
+    註冊一個策略。
+
+    Args:
+        indicators: {指標名稱: (種類, 來源欄位, 視窗)}，視窗以「交易日」為單位
+        entry: 進場條件運算式（逐列為 True 表示滿足條件），例如 "(close > sma_50)"
+        exit: 持倉時的策略出場運算式，可引用持倉成本 avg_cost；停損 / 固定停利由 config 統一處理
+        exit_label: 策略出場時寫入交易紀錄的動作名稱
+        score: 投資組合回測中排序進場候選的分數運算式（越大越優先）
+
+    運算式需以括號明確分組，例如 "(close > sma_150) & (sma_150 > sma_200)"。
+    """
+    for ind_name, (kind, source, window) in indicators.items():
+        if kind not in INDICATOR_KINDS:
+            raise ValueError(f"策略 {name} 的指標 {ind_name} 使用了未知的種類: {kind}")
+        if source not in PRICE_COLUMNS and source not in indicators:
+            raise ValueError(f"策略 {name} 的指標 {ind_name} 來源 {source} 未宣告")
+
+    allowed = set(PRICE_COLUMNS) | set(indicators)
+    STRATEGIES[name] = {
+        'name': name,
+        'description': description,
+        'indicators': dict(indicators),
+        'entry': _compile_rule(name, entry, allowed),
+        'exit': _compile_rule(name, exit, allowed | {'avg_cost'}) if exit else None,
+        'exit_label': exit_label,
+        'score': _compile_rule(name, score, allowed),
+    }
+    return STRATEGIES[name]
+
+
+def get_strategy(name: str = None) -> dict:
+    """依名稱取得策略（未指定時使用 DEFAULT_STRATEGY）。"""
+    name = name or DEFAULT_STRATEGY
+    if name not in STRATEGIES:
+        raise ValueError(f"未知的策略: {name}（可用策略: {', '.join(STRATEGIES)}）")
+    return STRATEGIES[name]
+
+
+def required_indicators(strategy_names) -> dict:
+    """
+    合併多個策略所需的指標；同名指標只計算一次，定義不一致時拋出 ValueError。
+    """
+    if isinstance(strategy_names, str) or strategy_names is None:
+        strategy_names = [strategy_names]
+    merged = {}
+    for name in strategy_names:
+        for ind_name, spec in get_strategy(name)['indicators'].items():
+            if merged.setdefault(ind_name, tuple(spec)) != tuple(spec):
+                raise ValueError(f"指標 {ind_name} 在不同策略中的定義不一致: {merged[ind_name]} / {spec}")
+    return merged
+
+
+def indicator_lookback(indicators: dict) -> int:
+    """計算所有指標暖機所需的最長交易日數（含 shift 疊加在其他指標上的天數）。"""
+    memo = {}
+
+    def lookback(name):
+        if name not in indicators:
+            return 0
+        if name not in memo:
+            kind, source, window = indicators[name]
+            memo[name] = lookback(source) + window
+        return memo[name]
+
+    return max((lookback(name) for name in indicators), default=0)
+
+
+def compute_indicators(df, indicators: dict, bars_per_day: int = 1):
     """
-    判斷單筆資料是否滿足所有買入條件（Minervini 六大趨勢過濾）。
+    在 DataFrame 上只計算指定的指標欄位。
 
-    條件：
-    1. 收盤價 > SMA150 且 > SMA200
-    2. SMA150 > SMA200
-    3. SMA200 斜率向上（現值 > 20 天前）
-    4. SMA50 > SMA150
-    5. 收盤價 > 52週低點 * 1.25
-    6. 收盤價 > 52週高點 * 0.75
+    Args:
+        bars_per_day: 視窗換算倍數；日線為 1，分K 為每日 K 棒數
     """
-    try:
-        cond1 = row['close'] > row['sma_150'] and row['close'] > row['sma_200']
-        cond2 = row['sma_150'] > row['sma_200']
-        cond3 = row['sma_200'] > row['sma_200_20d_ago']
-        cond4 = row['sma_50'] > row['sma_150']
-        cond5 = row['close'] > 1.25 * row['52w_low']
-        cond6 = row['close'] > 0.75 * row['52w_high']
-        return all([cond1, cond2, cond3, cond4, cond5, cond6])
-    except Exception:
-        return False
+    def build(name):
+        if name in df.columns:
+            return df[name]
+        kind, source, window = indicators[name]
+        df[name] = INDICATOR_KINDS[kind](build(source), window * bars_per_day)
+        return df[name]
+
+    for name in indicators:
+        build(name)
+    return df
 
 
-def calculate_latest_signal(df) -> str:
+def evaluate_rule(rule: dict, data, **scalars):
+    """
+    以向量化方式對規則運算式求值。
+
+    data 可以是 DataFrame 或 {名稱: ndarray} 的 dict；scalars 提供 avg_cost 等
+    純量或與資料同長度的陣列。安裝 numexpr 時使用 numexpr，否則以 NumPy 運算子求值。
+    """
+    namespace = {name: scalars[name] if name in scalars else np.asarray(data[name], dtype=float)
+                 for name in rule['names']}
+    if numexpr is not None:
+        return numexpr.evaluate(rule['expr'], local_dict=namespace)
+    with np.errstate(invalid='ignore'):
+        return eval(rule['code'], {'__builtins__': {}}, namespace)
+
+
+def buy_condition_mask(df, strategy: str = None):
+    """
+    計算整個 DataFrame 每一列是否滿足策略的進場條件。
+
+    NaN 參與的比較結果皆為 False，因此指標尚未暖機的資料列不會被視為滿足條件。
+
+    Returns:
+        Series[bool]
+    """
+    return pd.Series(evaluate_rule(get_strategy(strategy)['entry'], df).astype(bool), index=df.index)
+
+
+def new_breakout_mask(df, strategy: str = None):
+    """
+    計算「新突破」遮罩：昨日未滿足、今日滿足進場條件。
+
+    Returns:
+        Series[bool]
+    """
+    buy_mask = buy_condition_mask(df, strategy)
+    return buy_mask & (~buy_mask.shift(1, fill_value=False))
+
+
+def exit_condition(data, avg_cost, strategy: str = None):
+    """
+    計算持倉時的策略出場條件（例如 Minervini 的跌破 MA50 保本停利）。
+
+    avg_cost 可為純量或與資料對齊的陣列；策略未定義出場規則時全部為 False。
+
+    Returns:
+        ndarray[bool]
+    """
+    rule = get_strategy(strategy)['exit']
+    if rule is None:
+        return np.zeros(len(data['close']), dtype=bool)
+    return np.asarray(evaluate_rule(rule, data, avg_cost=avg_cost), dtype=bool)
+
+
+def calculate_latest_signal(df, strategy: str = None) -> str:
     """
     根據最新兩筆資料計算即時交易訊號。
 
@@ -39,26 +187,59 @@ def calculate_latest_signal(df) -> str:
     if df is None or len(df) < 2:
         return "資料不足"
 
-    today = df.iloc[-1]
-    yesterday_met = is_buy_condition_met(df.iloc[-2])
-    today_met = is_buy_condition_met(today)
-
-    if today_met and not yesterday_met:
+    if new_breakout_mask(df.iloc[-2:], strategy).iloc[-1]:
         return "買入"
 
     return "持有"
 
 
-def apply_signals_to_dataframe(df):
+def apply_signals_to_dataframe(df, strategy: str = None):
     """
     對整個 DataFrame 應用買入訊號標記（用於回測）。
 
     Returns:
         DataFrame：新增 'signal' 欄位（"買入" / "持有"）
     """
-    buy_mask = df.apply(is_buy_condition_met, axis=1)
     # 只有昨日未滿足、今日滿足才是「新突破」
-    new_buy_mask = buy_mask & (~buy_mask.shift(1).fillna(False))
+    new_buy_mask = new_breakout_mask(df, strategy)
     df['signal'] = '持有'
     df.loc[new_buy_mask, 'signal'] = '買入'
     return df
+
+
+# --- 內建策略 ---
+
+register_strategy(
+    'minervini',
+    description='Minervini 趨勢模板六大條件，新突破時進場；跌破 MA50 且帳面獲利時保本出場',
+    indicators={
+        'sma_50': ('sma', 'close', 50),
+        'sma_150': ('sma', 'close', 150),
+        'sma_200': ('sma', 'close', 200),
+        'high_52w': ('rolling_max', 'high', 252),
+        'low_52w': ('rolling_min', 'low', 252),
+        'sma_200_20d_ago': ('shift', 'sma_200', 20),
+    },
+    # 1. 收盤價 > SMA150 且 > SMA200   2. SMA150 > SMA200   3. SMA200 斜率向上（現值 > 20 天前）
+    # 4. SMA50 > SMA150               5. 收盤價 > 52週低點 * 1.25   6. 收盤價 > 52週高點 * 0.75
+    entry=(
+        "(close > sma_150) & (close > sma_200) & (sma_150 > sma_200) & (sma_200 > sma_200_20d_ago)"
+        " & (sma_50 > sma_150) & (close > 1.25 * low_52w) & (close > 0.75 * high_52w)"
+    ),
+    exit="(close < sma_50) & (close > avg_cost)",
+    exit_label='動態停利(跌破MA50)',
+    score='close / low_52w',
+)
+
+register_strategy(
+    'ma_trend',
+    description='均線多頭排列：收盤價站上 MA50 且 MA50 > MA200 時進場，跌破 MA50 出場',
+    indicators={
+        'sma_50': ('sma', 'close', 50),
+        'sma_200': ('sma', 'close', 200),
+    },
+    entry="(close > sma_50) & (sma_50 > sma_200)",
+    exit="(close < sma_50)",
+    exit_label='趨勢出場(跌破MA50)',
+    score='close / sma_200',
+)